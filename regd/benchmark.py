@@ -0,0 +1,289 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+Benchmarks of the decorator registry hot paths
+
+Run all the benchmarks and print JSON results with:
+::
+	python -m regd.benchmark
+
+or write them to a file and limit the synthetic modules sizes:
+::
+	python -m regd.benchmark --output results.json --sizes 100 1000
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import types
+from regd.registry import DecoratorRegistry
+
+def _decorator( fn) :
+	def wrapper( *args, **kwargs) :
+		return fn( *args, **kwargs)
+	return wrapper
+
+def _parametrized_decorator( *dargs, **dkwargs) :
+	return _decorator
+
+def _measure( fn, number, repeat = 5) :
+	""" Returns the best time of a single fn() call in nanoseconds """
+	best = None
+
+	for _ in range( repeat) :
+		started = time.perf_counter_ns()
+		for _ in range( number) :
+			fn()
+		elapsed = ( time.perf_counter_ns() - started) / float( number)
+		best = elapsed if best is None else min( best, elapsed)
+
+	return best
+
+def _function( name, module, qualname = None) :
+	""" Returns a new function with the given names """
+	def fn( *args) :
+		return args
+	fn.__name__     = name
+	fn.__qualname__ = qualname or name
+	fn.__module__   = module
+	return fn
+
+def _decorators( registry, depth) :
+	""" Returns a list of depth decorators registered in the given registry """
+	return [registry.decorator( _decorator) for _ in range( depth)]
+
+def synthetic_module( name, size, decorators, methods_per_class = 10) :
+	"""Builds a module with size functions decorated with all the given decorators
+
+	Every tenth function is a method of a class with methods_per_class methods.
+
+	:param name: module name
+	:param size: number of decorated functions and methods
+	:param decorators: registered decorators to apply
+	:rtype: module
+	"""
+	module  = types.ModuleType( name)
+	methods = size // 10
+
+	def decorate( fn) :
+		for decorator in decorators :
+			fn = decorator( fn)
+		return fn
+
+	for i in range( size - methods) :
+		fname = 'function%d' %i
+		setattr( module, fname, decorate( _function( fname, name)))
+
+	for i in range( 0, methods, methods_per_class) :
+		cname     = 'Class%d' %i
+		namespace = { '__module__' : name }
+
+		for j in range( i, min( i + methods_per_class, methods)) :
+			mname = 'method%d' %j
+			namespace[mname] = decorate( _function( mname, name, '%s.%s' %(cname, mname)))
+
+		setattr( module, cname, type( cname, ( object,), namespace))
+
+	return module
+
+def bench_registration( results, number) :
+	registry = DecoratorRegistry()
+
+	results.append( {
+		'name'      : 'register.decorator',
+		'ns_per_op' : _measure( lambda : registry.decorator( _decorator), number),
+	})
+	results.append( {
+		'name'      : 'register.parametrized_decorator',
+		'ns_per_op' : _measure( lambda : registry.parametrized_decorator( _parametrized_decorator), number),
+	})
+
+def bench_decoration( results, number) :
+	registry = DecoratorRegistry()
+
+	for depth in range( 1, 11) :
+		decorators = _decorators( registry, depth)
+
+		def decorate() :
+			fn = _function( 'fn', __name__)
+			for decorator in decorators :
+				fn = decorator( fn)
+
+		results.append( {
+			'name'      : 'decorate',
+			'params'    : { 'depth' : depth },
+			'ns_per_op' : _measure( decorate, number),
+		})
+
+def bench_queries( results, number) :
+	registry = DecoratorRegistry()
+
+	for depth in ( 1, 5, 10) :
+		decorators = _decorators( registry, depth)
+		fn = _function( 'fn', __name__)
+		for decorator in decorators :
+			fn = decorator( fn)
+
+		first, last = decorators[0], decorators[-1]
+		other = registry.decorator( _decorator)
+
+		for name, query in [
+			( 'get_decorators',        lambda : registry.get_decorators( fn)),
+			( 'get_real_function',     lambda : registry.get_real_function( fn)),
+			( 'is_decorated_with',     lambda : registry.is_decorated_with( fn, first)),
+			( 'is_decorated_with.miss', lambda : registry.is_decorated_with( fn, other)),
+			( 'is_decorated_with_all', lambda : registry.is_decorated_with_all( fn, first, last)),
+		] :
+			results.append( {
+				'name'      : name,
+				'params'    : { 'depth' : depth },
+				'ns_per_op' : _measure( query, number),
+			})
+
+def bench_module_queries( results, sizes) :
+	for size in sizes :
+		registry   = DecoratorRegistry()
+		decorators = _decorators( registry, 2)
+		module     = synthetic_module( 'regd_benchmark_%d' %size, size, decorators)
+		cls        = getattr( module, 'Class0')
+		number     = max( 1, 100000 // size)
+
+		for name, query in [
+			( 'decorated_methods',
+				lambda : list( registry.decorated_methods( cls, decorators[0]))),
+			( 'all_decorated_module_functions',
+				lambda : list( registry.all_decorated_module_functions( module))),
+			( 'module_functions_decorated_with',
+				lambda : list( registry.module_functions_decorated_with( module, decorators[1]))),
+			( 'functions_decorated_with',
+				lambda : registry.functions_decorated_with( decorators[1], module)),
+		] :
+			ns = _measure( query, number, repeat = 3)
+			results.append( {
+				'name'            : name,
+				'params'          : { 'size' : size },
+				'ns_per_op'       : ns,
+				'functions_per_s' : size * 1e9 / ns if name != 'decorated_methods' else None,
+			})
+
+		registry.track_modules( True)
+		try :
+			for name, query in [
+				( 'all_decorated_module_functions',
+					lambda : list( registry.all_decorated_module_functions( module))),
+				( 'module_functions_decorated_with',
+					lambda : list( registry.module_functions_decorated_with( module, decorators[1]))),
+			] :
+				ns = _measure( query, number, repeat = 3)
+				results.append( {
+					'name'            : name,
+					'params'          : { 'size' : size, 'track_modules' : True },
+					'ns_per_op'       : ns,
+					'functions_per_s' : size * 1e9 / ns,
+				})
+		finally :
+			registry.track_modules( False)
+
+def bench_memory( results, size) :
+	for depth in ( 1, 3) :
+		decorators = _decorators( DecoratorRegistry(), depth)
+		functions  = [_function( 'function%d' %i, __name__) for i in range( size)]
+
+		gc.collect()
+		tracemalloc.start()
+		try :
+			baseline = tracemalloc.get_traced_memory()[0]
+			decorated = []
+			for fn in functions :
+				for decorator in decorators :
+					fn = decorator( fn)
+				decorated.append( fn)
+			used = tracemalloc.get_traced_memory()[0] - baseline
+		finally :
+			tracemalloc.stop()
+
+		# bare wrappers cost, so that only the registry overhead is reported
+		tracemalloc.start()
+		try :
+			baseline = tracemalloc.get_traced_memory()[0]
+			plain = []
+			for fn in functions :
+				for _ in decorators :
+					fn = _decorator( fn)
+				plain.append( fn)
+			bare = tracemalloc.get_traced_memory()[0] - baseline
+		finally :
+			tracemalloc.stop()
+
+		results.append( {
+			'name'                : 'memory',
+			'params'              : { 'depth' : depth, 'size' : size },
+			'bytes_per_function'  : used / float( size),
+			'registry_bytes_per_function' : ( used - bare) / float( size),
+		})
+
+		del decorated, plain
+
+def run( sizes = ( 100, 1000, 10000, 100000), number = 10000) :
+	"""Runs all the benchmarks
+
+	:param sizes: sizes of the synthetic modules
+	:param number: number of calls per measurement of the fast operations
+	:rtype: dict of the benchmark environment and list of results
+	"""
+	results = []
+
+	bench_registration( results, number)
+	bench_decoration( results, max( 1, number // 10))
+	bench_queries( results, number)
+	bench_module_queries( results, sizes)
+	bench_memory( results, max( sizes))
+
+	return {
+		'python'         : platform.python_version(),
+		'implementation' : platform.python_implementation(),
+		'platform'       : platform.platform(),
+		'results'        : results,
+	}
+
+def main( argv = None) :
+	parser = argparse.ArgumentParser( description = 'Benchmarks of the decorator registry')
+	parser.add_argument( '--output', '-o', help = 'file to write JSON results to, stdout by default')
+	parser.add_argument( '--sizes', type = int, nargs = '+', default = [100, 1000, 10000, 100000],
+		help = 'numbers of functions of the synthetic modules')
+	parser.add_argument( '--number', type = int, default = 10000,
+		help = 'calls per measurement of the fast operations')
+	args = parser.parse_args( argv)
+
+	report = json.dumps( run( args.sizes, args.number), indent = 1, sort_keys = True)
+
+	if args.output :
+		with open( args.output, 'w') as f :
+			f.write( report)
+	else :
+		sys.stdout.write( report + '\n')
+
+if __name__ == "__main__" :
+	main()
@@ -0,0 +1,171 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+Generated wrappers of the hook decorators with the exact signatures of the wrapped functions
+"""
+import functools
+import inspect
+import threading
+
+_PREFIX = '_regd_'
+
+# generated wrapper factories { ( shape, befores, afters, around, coroutine ) : factory }
+_factories = {}
+_lock      = threading.Lock()
+
+# shape used for the functions which signature is unknown or clashes with the generated names
+_GENERIC_SHAPE = (
+	( inspect.Parameter.VAR_POSITIONAL, 'args', False),
+	( inspect.Parameter.VAR_KEYWORD, 'kwargs', False),
+)
+
+_POSITIONAL = ( inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+
+def _inspect( fn) :
+	""" Private function, returns ( shape, positional defaults, keyword-only defaults ) """
+	try :
+		parameters = inspect.signature( fn, follow_wrapped = False).parameters.values()
+	except ( TypeError, ValueError) :
+		return _GENERIC_SHAPE, None, None
+
+	shape = tuple(
+		( parameter.kind, parameter.name, parameter.default is not parameter.empty)
+		for parameter in parameters)
+
+	if any( name.startswith( _PREFIX) for _, name, _ in shape) :
+		return _GENERIC_SHAPE, None, None
+
+	# defaults come from the signature, partials, callable objects and classes have no
+	# __defaults__ of their own
+	defaults = tuple( parameter.default for parameter in parameters
+		if parameter.default is not parameter.empty and parameter.kind in _POSITIONAL)
+	kwdefaults = dict( ( parameter.name, parameter.default) for parameter in parameters
+		if parameter.default is not parameter.empty and parameter.kind is inspect.Parameter.KEYWORD_ONLY)
+
+	return shape, defaults or None, kwdefaults or None
+
+def signature_shape( fn) :
+	"""Returns the shape of the function signature: parameters kinds, names and if they have
+	default values. Wrappers are generated once per shape, default values and annotations
+	are not the part of it.
+
+	:param fn: function
+	:rtype: tuple of ( kind, name, has default )
+	"""
+	return _inspect( fn)[0]
+
+def _source( shape, befores, afters, around, coroutine) :
+	""" Private function, returns the source of a wrapper factory """
+	params, forward, positional_only = [], [], False
+
+	for kind, name, has_default in shape :
+		if kind is inspect.Parameter.POSITIONAL_ONLY :
+			positional_only = True
+		elif positional_only :
+			params.append( '/')
+			positional_only = False
+
+		if kind is inspect.Parameter.VAR_POSITIONAL :
+			params.append( '*' + name)
+			forward.append( '*' + name)
+		elif kind is inspect.Parameter.VAR_KEYWORD :
+			params.append( '**' + name)
+			forward.append( '**' + name)
+		elif kind is inspect.Parameter.KEYWORD_ONLY :
+			if not any( param.startswith( '*') for param in params) :
+				params.append( '*')
+			params.append( name + ( ' = None' if has_default else ''))
+			forward.append( '%s = %s' %( name, name))
+		else :
+			params.append( name + ( ' = None' if has_default else ''))
+			forward.append( name)
+
+	if positional_only :
+		params.append( '/')
+
+	forward = ', '.join( forward)
+	await_  = 'await ' if coroutine else ''
+
+	lines = ['def _regd_factory( _regd_fn, _regd_before, _regd_after, _regd_around) :']
+	lines += ['\t_regd_b%d = _regd_before[%d]' %( i, i) for i in range( befores)]
+	lines += ['\t_regd_a%d = _regd_after[%d]' %( i, i) for i in range( afters)]
+	lines.append( '\t%sdef wrapper( %s) :' %( 'async ' if coroutine else '', ', '.join( params)))
+	lines += ['\t\t_regd_b%d( %s)' %( i, forward) for i in range( befores)]
+
+	if around :
+		lines.append( '\t\t_regd_result = %s_regd_around( _regd_fn%s)' %( await_, ', ' + forward if forward else ''))
+	else :
+		lines.append( '\t\t_regd_result = %s_regd_fn( %s)' %( await_, forward))
+
+	lines += ['\t\t_regd_result = _regd_a%d( _regd_result)' %i for i in reversed( range( afters))]
+	lines.append( '\t\treturn _regd_result')
+	lines.append( '\treturn wrapper')
+
+	return '\n'.join( lines) + '\n'
+
+def _factory( shape, befores, afters, around, coroutine) :
+	""" Private function, returns the cached wrapper factory generating it if needed """
+	key     = ( shape, befores, afters, around, coroutine)
+	factory = _factories.get( key)
+
+	if factory is None :
+		namespace = {}
+		exec( compile( _source( *key), '<regd wrapper>', 'exec'), namespace)
+
+		with _lock :
+			factory = _factories.setdefault( key, namespace['_regd_factory'])
+
+	return factory
+
+def make_wrapper( fn, before = (), after = (), around = None) :
+	"""Returns a wrapper of the function calling the hooks with the exact signature of it
+
+	Arguments are forwarded to the function and to the hooks the same way they are declared,
+	so calls do not pack and unpack *args and **kwargs unless the function itself takes them.
+	Wrapper code is generated once per signature shape and hooks count and is shared then.
+
+	before hooks are called with the arguments of the call in the given order, after hooks
+	take the result and return the new one in the reverse order, so the hooks of the first
+	decorator are the outermost. around hook is called instead of the function as
+	around( fn, *args, **kwargs).
+
+	:param fn: function to wrap
+	:param before: sequence of the hooks called before the function
+	:param after: sequence of the hooks called after the function
+	:param around: optional hook called instead of the function
+	:rtype: function
+	"""
+	before, after = tuple( before), tuple( after)
+	shape, defaults, kwdefaults = _inspect( fn)
+	factory = _factory( shape, len( before), len( after), around is not None,
+		inspect.iscoroutinefunction( fn))
+	wrapper = factory( fn, before, after, around)
+
+	wrapper.__defaults__   = defaults
+	wrapper.__kwdefaults__ = kwdefaults
+
+	try :
+		functools.update_wrapper( wrapper, fn)
+	except AttributeError :
+		pass
+
+	return wrapper
@@ -0,0 +1,205 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+Columnar view of the registry: functions by decorators bit matrix
+"""
+import array
+
+try :
+	import numpy
+except ImportError :
+	numpy = None
+
+def _bitset( rows, size) :
+	""" Private function, returns int with the bits of the given row numbers set """
+	bits = bytearray( ( size + 7) // 8)
+
+	for row in rows :
+		bits[row >> 3] |= 1 << ( row & 7)
+
+	return int.from_bytes( bits, 'little')
+
+class DecoratorMatrix( object) :
+	"""
+	Snapshot of the registry as a bit matrix of real functions by registered decorators,
+	returned by DecoratorRegistry.matrix().
+
+	Every decorator column and every module is kept as a bitset of the function rows packed into
+	a single int, so the filters and counts are a few bitwise operations over the whole column
+	instead of a Python loop over the functions:
+	::
+		matrix = DecoratorRegistry.matrix()
+
+		# handlers with auth but without rate limit
+		for fn in matrix.select( all_of = [auth], none_of = [rate_limit]) :
+			print( fn.__module__, fn.__qualname__)
+
+		# { module name : { decorator : count } }
+		print( matrix.counts_by_module())
+
+	The snapshot is not updated by later decorations, build the new one with
+	DecoratorRegistry.matrix() when DecoratorRegistry.generation changes.
+
+	:ivar functions: tuple of real functions, the matrix rows
+	:ivar decorators: tuple of registered decorators, the matrix columns
+	:ivar modules: tuple of module names of the rows
+	:ivar generation: registry generation the matrix was built at
+	"""
+
+	def __init__( self, functions, decorators, rows_of, modules, generation) :
+		"""
+		:param functions: sequence of real functions
+		:param decorators: sequence of registered decorators
+		:param rows_of: function( decorator) returning the row numbers of the decorated functions
+		:param modules: sequence of module names of the functions
+		:param generation: registry generation
+		"""
+		self.functions  = tuple( functions)
+		self.decorators = tuple( decorators)
+		self.modules    = tuple( modules)
+		self.generation = generation
+
+		size = len( self.functions)
+
+		self._all     = ( 1 << size) - 1
+		self._columns = dict( ( decorator, _bitset( rows_of( decorator), size)) for decorator in self.decorators)
+
+		module_rows = {}
+		for row, module in enumerate( self.modules) :
+			module_rows.setdefault( module, []).append( row)
+
+		self._modules = dict( ( module, _bitset( rows, size)) for module, rows in module_rows.items())
+
+	def __len__( self) :
+		return len( self.functions)
+
+	def column( self, decorator) :
+		"""Returns the column of a decorator
+
+		:param decorator: registered decorator
+		:rtype: int bitset, bit n is set when the function of row n is decorated with it
+		"""
+		return self._columns.get( decorator, 0)
+
+	def mask( self, all_of = (), any_of = (), none_of = (), module = None) :
+		"""Returns the rows bitset matching the filters
+
+		:param all_of: decorators every matching function is decorated with
+		:param any_of: decorators each matching function is decorated with at least one of
+		:param none_of: decorators no matching function is decorated with
+		:param module: optional module object or module name to filter the rows with
+		:rtype: int bitset
+		"""
+		mask = self._all
+
+		if module is not None :
+			mask &= self._modules.get( module if isinstance( module, str) else module.__name__, 0)
+
+		for decorator in all_of :
+			mask &= self.column( decorator)
+
+		if any_of :
+			found = 0
+			for decorator in any_of :
+				found |= self.column( decorator)
+			mask &= found
+
+		for decorator in none_of :
+			mask &= ~self.column( decorator)
+
+		return mask
+
+	def rows( self, mask) :
+		"""Returns the row numbers of a bitset
+
+		:param mask: int bitset
+		:rtype: list of int
+		"""
+		rows, base = [], 0
+		data = mask.to_bytes( ( mask.bit_length() + 7) // 8, 'little')
+
+		for byte in data :
+			while byte :
+				low = byte & -byte
+				rows.append( base + low.bit_length() - 1)
+				byte ^= low
+			base += 8
+
+		return rows
+
+	def select( self, all_of = (), any_of = (), none_of = (), module = None) :
+		"""Returns the functions matching the filters, see mask()
+
+		:rtype: list of real functions in rows order
+		"""
+		functions = self.functions
+		return [functions[row] for row in self.rows( self.mask( all_of, any_of, none_of, module))]
+
+	def count( self, all_of = (), any_of = (), none_of = (), module = None) :
+		"""Returns the number of functions matching the filters, see mask()
+
+		:rtype: int
+		"""
+		return bin( self.mask( all_of, any_of, none_of, module)).count( '1')
+
+	def counts_by_module( self, decorators = None) :
+		"""Returns the number of functions decorated with each decorator per module
+
+		:param decorators: decorators to count, all the matrix columns by default
+		:rtype: dict { module name : { decorator : count } } without zero counts
+		"""
+		counts = {}
+
+		for module, rows in self._modules.items() :
+			for decorator in ( self.decorators if decorators is None else decorators) :
+				count = bin( rows & self.column( decorator)).count( '1')
+				if count :
+					counts.setdefault( module, {})[decorator] = count
+
+		return counts
+
+	def to_array( self) :
+		"""Exports the matrix as rows by columns booleans
+
+		:rtype: numpy bool array of ( functions, decorators ) shape when numpy is available,
+		        otherwise array.array( 'B') of 0 and 1 in rows order
+		"""
+		size, width = len( self.functions), len( self.decorators)
+
+		if numpy is not None :
+			matrix = numpy.zeros( ( size, width), dtype = bool)
+
+			for i, decorator in enumerate( self.decorators) :
+				column = self.column( decorator).to_bytes( ( size + 7) // 8, 'little')
+				matrix[:, i] = numpy.unpackbits(
+					numpy.frombuffer( column, dtype = numpy.uint8), bitorder = 'little')[:size]
+
+			return matrix
+
+		matrix = array.array( 'B', bytes( size * width))
+
+		for i, decorator in enumerate( self.decorators) :
+			for row in self.rows( self.column( decorator)) :
+				matrix[row * width + i] = 1
+
+		return matrix
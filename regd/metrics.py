@@ -0,0 +1,304 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+Call metrics of the functions decorated with instrumented registered decorators
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+import weakref
+
+# counter layout: calls, errors, sampled calls, sampled time in ns, histogram buckets...
+_CALLS, _ERRORS, _SAMPLED, _TOTAL, _BUCKETS = range( 5)
+
+class _ThreadOwner( object) :
+	""" Private class, thread-local object which is collected when its thread exits """
+	__slots__ = ( '__weakref__',)
+
+class CallMetrics( object) :
+	"""
+	Per function call metrics of registered decorators.
+
+	Registered decorators given a CallMetrics instance wrap every wrapper they produce with a
+	thin counting one. Every call and every raised exception is counted, while the latency is
+	measured only for every sample_every-th call of a function, so the hot path mostly costs a
+	thread-local lookup and an increment. Counters are kept in per-thread buffers and merged
+	only by snapshot(), so the threads never contend for them. Counters of the finished threads
+	are folded into the shared totals, so short-lived threads do not leave their buffers behind.
+
+	Usage example:
+	::
+		from regd import DecoratorRegistry
+		from regd.metrics import CallMetrics
+
+		metrics = CallMetrics( sample_every = 16)
+		route   = DecoratorRegistry.parametrized_decorator( route, metrics = metrics)
+
+		# ... serve requests ...
+
+		for ( function, decorator), stats in metrics.snapshot().items() :
+			print( "%s @%s: %d calls, %d errors" %( function, decorator, stats['calls'], stats['errors']))
+
+		metrics.write_prometheus( '/var/lib/node_exporter/regd.prom')
+
+	Latency histogram is built of the sampled calls only. Time of a layer includes the time of
+	all the layers and the function it wraps.
+	"""
+
+	BUCKETS = ( 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+	def __init__( self, sample_every = 16, buckets = None) :
+		"""
+		:param sample_every: measure latency of every n-th call of a function, 1 to measure all
+		:param buckets: upper bounds of the latency histogram buckets in seconds
+		"""
+		if sample_every < 1 :
+			raise ValueError( "sample_every should be positive, not %r" %( sample_every,))
+
+		self.sample_every = sample_every
+		self.buckets      = tuple( sorted( buckets or self.BUCKETS))
+		self._bounds      = tuple( int( bound * 1e9) for bound in self.buckets)
+		self._local       = threading.local()
+		self._lock        = threading.Lock()
+		self._buffers     = {}
+		self._retired     = {}
+		self._keys        = weakref.WeakKeyDictionary()
+		self._labels      = {}
+
+	def _counter( self, key) :
+		""" Private method, returns the counter of the current thread creating it if needed """
+		try :
+			counters = self._local.counters
+		except AttributeError :
+			counters = self._local.counters = {}
+			owner    = self._local.owner    = _ThreadOwner()
+			with self._lock :
+				self._buffers[id( counters)] = counters
+			weakref.finalize( owner, self._retire, counters)
+
+		counter = counters[key] = [0] * ( _BUCKETS + len( self._bounds) + 1)
+		return counter
+
+	def _retire( self, counters) :
+		""" Private method, folds the counters of a finished thread into the totals """
+		with self._lock :
+			self._buffers.pop( id( counters), None)
+			self._merge( self._retired, counters)
+
+	@staticmethod
+	def _merge( merged, counters) :
+		""" Private method """
+		for key, counter in list( counters.items()) :
+			total = merged.get( key)
+
+			if total is None :
+				merged[key] = list( counter)
+			else :
+				for i, value in enumerate( counter) :
+					total[i] += value
+
+	def _key( self, native_fn, decorator) :
+		"""Private method
+		Returns the counters key of a function decorated with a decorator. Keys are the labels of
+		the function and the decorator, they are made unique when different functions or
+		decorators share the names, like the closures or the lambdas do.
+		"""
+		with self._lock :
+			try :
+				keys = self._keys.setdefault( native_fn, {})
+			except TypeError :
+				keys = {}
+
+			key = keys.get( decorator)
+
+			if key is not None :
+				return key
+
+			function = '%s.%s' %( getattr( native_fn, '__module__', None),
+				getattr( native_fn, '__qualname__', getattr( native_fn, '__name__', '?')))
+			name     = getattr( decorator, '__name__', repr( decorator))
+			key, n   = ( function, name), 1
+
+			# same-named functions of a decorator are numbered, otherwise same-named decorators
+			same_decorator = key in self._labels and self._labels[key] is decorator
+
+			while key in self._labels :
+				n  += 1
+				key = ( '%s#%d' %( function, n), name) if same_decorator else ( function, '%s#%d' %( name, n))
+
+			keys[decorator]   = key
+			self._labels[key] = decorator
+
+		return key
+
+	def instrument( self, native_fn, decorator, wrapper) :
+		"""Returns the counting wrapper of a wrapper produced by a registered decorator
+
+		It's called by registered decorators, there is no need to call it directly.
+
+		:param native_fn: real function the wrapper belongs to
+		:param decorator: registered decorator produced the wrapper
+		:param wrapper: the wrapper to count the calls of
+		:rtype: function
+		"""
+		key = self._key( native_fn, decorator)
+
+		local        = self._local
+		counter_of   = self._counter
+		sample_every = self.sample_every
+		bounds       = self._bounds
+		clock        = time.perf_counter_ns
+		bisect_left  = bisect.bisect_left
+
+		# counter indexes are inlined, this is the hot path
+		def instrumented( *args, **kwargs) :
+			try :
+				counter = local.counters[key]
+			except ( AttributeError, KeyError) :
+				counter = counter_of( key)
+
+			calls = counter[0] = counter[0] + 1
+
+			if calls % sample_every :
+				try :
+					return wrapper( *args, **kwargs)
+				except Exception :
+					counter[1] += 1
+					raise
+
+			started = clock()
+			try :
+				return wrapper( *args, **kwargs)
+			except Exception :
+				counter[1] += 1
+				raise
+			finally :
+				elapsed = clock() - started
+				counter[2] += 1
+				counter[3] += elapsed
+				counter[4 + bisect_left( bounds, elapsed)] += 1
+
+		try :
+			functools.update_wrapper( instrumented, wrapper)
+		except AttributeError :
+			pass
+
+		return instrumented
+
+	def snapshot( self) :
+		"""Merges the counters of all the threads
+
+		Different functions or decorators sharing the names are counted apart, their names get
+		the #n suffix in the order they were instrumented.
+
+		:rtype: dict { ( "module.qualname", decorator name ) : dict } where every dict has calls,
+		        errors, sampled, seconds (total time of the sampled calls) and buckets - the list
+		        of ( upper bound, cumulative count ) of the sampled calls
+		"""
+		merged = {}
+
+		with self._lock :
+			buffers = list( self._buffers.values())
+			self._merge( merged, self._retired)
+
+		for counters in buffers :
+			self._merge( merged, counters)
+
+		snapshot = {}
+
+		for key, counter in merged.items() :
+			cumulative, buckets = 0, []
+
+			for bound, count in zip( self.buckets + ( float( 'inf'),), counter[_BUCKETS:]) :
+				cumulative += count
+				buckets.append( ( bound, cumulative))
+
+			snapshot[key] = {
+				'calls'   : counter[_CALLS],
+				'errors'  : counter[_ERRORS],
+				'sampled' : counter[_SAMPLED],
+				'seconds' : counter[_TOTAL] / 1e9,
+				'buckets' : buckets,
+			}
+
+		return snapshot
+
+	def reset( self) :
+		"""Drops all the counters"""
+		with self._lock :
+			self._retired.clear()
+			for counters in self._buffers.values() :
+				counters.clear()
+
+	def prometheus( self, prefix = 'regd') :
+		"""Returns the snapshot in the Prometheus text exposition format
+
+		:param prefix: metrics names prefix
+		:rtype: str
+		"""
+		def escape( value) :
+			return value.replace( '\\', '\\\\').replace( '"', '\\"').replace( '\n', '\\n')
+
+		def number( value) :
+			return '+Inf' if value == float( 'inf') else repr( float( value))
+
+		snapshot = sorted( self.snapshot().items())
+		lines    = []
+
+		for name, kind, help_text in [
+			( 'calls_total',  'counter', 'Calls of the decorated functions'),
+			( 'errors_total', 'counter', 'Calls of the decorated functions raised an exception'),
+			( 'call_duration_seconds', 'histogram', 'Latency of the sampled calls of the decorated functions'),
+		] :
+			lines.append( '# HELP %s_%s %s' %( prefix, name, help_text))
+			lines.append( '# TYPE %s_%s %s' %( prefix, name, kind))
+
+			for ( function, decorator), stats in snapshot :
+				labels = 'function="%s",decorator="%s"' %( escape( function), escape( decorator))
+
+				if kind == 'counter' :
+					lines.append( '%s_%s{%s} %d' %( prefix, name, labels, stats[name[:-len( '_total')]]))
+					continue
+
+				for bound, count in stats['buckets'] :
+					lines.append( '%s_%s_bucket{%s,le="%s"} %d' %( prefix, name, labels, number( bound), count))
+
+				lines.append( '%s_%s_sum{%s} %r' %( prefix, name, labels, stats['seconds']))
+				lines.append( '%s_%s_count{%s} %d' %( prefix, name, labels, stats['sampled']))
+
+		return '\n'.join( lines) + '\n'
+
+	def write_prometheus( self, path, prefix = 'regd') :
+		"""Writes the snapshot in the Prometheus text format to a file atomically, so it's safe
+		to point the node exporter textfile collector to it
+
+		:param path: file path
+		:param prefix: metrics names prefix
+		"""
+		tmp_path = '%s.%d.tmp' %( path, os.getpid())
+
+		with open( tmp_path, 'w') as f :
+			f.write( self.prometheus( prefix))
+
+		os.replace( tmp_path, path)
@@ -20,7 +20,197 @@ COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
 IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
+import collections
+import contextlib
+import inspect
+import os
+import sys
+import threading
 import types
+import weakref
+from regd.hooks import make_wrapper
+from regd.matrix import DecoratorMatrix
+
+_CacheInfo = collections.namedtuple( 'CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+_Change    = collections.namedtuple( 'Change', ['generation', 'action', 'function', 'decorator',
+                                                'module', 'qualname'])
+
+_RECORD_SLOTS = ( 'native_function', 'native_record', 'decorator', 'decorators', 'mask', 'layers',
+                  'module', 'qualname')
+
+def _init_record( record) :
+	""" Sets the metadata of a new record to its defaults """
+	record.native_function = None
+	record.native_record   = None
+	record.decorator       = None
+	record.decorators      = ()
+	record.mask            = 0
+	record.layers          = ()
+	record.module          = None
+	record.qualname        = None
+
+class _FunctionRecord( weakref.KeyedRef) :
+	"""
+	Registry metadata of a single function kept in the registry side table. The record is the
+	weak reference to the function itself, its key is the id of the function.
+	Wrappers produced by registered decorators have native_function and decorator set,
+	real (native) functions collect the decorators and the layers applied to them.
+	native_record caches the record of native_function once the link chain is resolved.
+	module and qualname of indexed real functions are kept for the changes logged when the
+	function is garbage collected.
+	"""
+	__slots__ = _RECORD_SLOTS
+	
+	def __init__( self, fn, callback, key) :
+		super( _FunctionRecord, self).__init__( fn, callback, key)
+		_init_record( self)
+
+class _WrapperRecord( weakref.KeyedRef) :
+	"""
+	Lighter record of a wrapper produced by a registered decorator: wrappers only link to their
+	real function, so the metadata of real functions is read from the class defaults.
+	"""
+	__slots__ = ( 'native_function', 'native_record', 'decorator')
+	
+	decorators = ()
+	mask       = 0
+	layers     = ()
+	module     = None
+	qualname   = None
+	
+	def __init__( self, fn, callback, key) :
+		super( _WrapperRecord, self).__init__( fn, callback, key)
+		self.native_function = None
+		self.native_record   = None
+		self.decorator       = None
+
+class _StrongRecord( object) :
+	"""
+	Record of a function which does not support weak references, the registry keeps the function
+	alive. It's called the same way as _FunctionRecord to get the function.
+	"""
+	__slots__ = ( 'obj', 'key') + _RECORD_SLOTS
+	
+	def __init__( self, fn, callback, key) :
+		self.obj = fn
+		self.key = key
+		_init_record( self)
+	
+	def __call__( self) :
+		return self.obj
+
+class _Layer( object) :
+	"""
+	Single application of a registered decorator to a real function: the decorator, weak
+	references to the function it was applied to and to the wrapper it produced and the
+	arguments of a parametrized decorator
+	"""
+	__slots__ = ( 'decorator', 'inner', 'wrapper', 'args', 'kw')
+	
+	def __init__( self, decorator, inner, wrapper, args, kw) :
+		self.decorator = decorator
+		self.inner     = inner
+		self.wrapper   = wrapper
+		self.args      = args
+		self.kw        = kw
+
+class _StrongRef( object) :
+	"""
+	Strong reference to an object which does not support weak references. It's called
+	the same way as weakref.ref to get the object.
+	"""
+	__slots__ = ( 'obj',)
+	
+	def __init__( self, obj) :
+		self.obj = obj
+	
+	def __call__( self) :
+		return self.obj
+
+def _dead() :
+	""" Dead weak reference stand-in """
+	return None
+
+def _ref( obj) :
+	""" Returns weak reference to the object or the strong one if it's not weak referenceable """
+	try :
+		return weakref.ref( obj)
+	except TypeError :
+		return _StrongRef( obj)
+
+def _alive( refs) :
+	""" Returns the live objects of the weak references of an index entry { id : weak reference } """
+	return [obj for obj in [ref() for ref in list( refs.values())] if obj is not None]
+
+class _ModuleTracker( object) :
+	"""
+	sys.meta_path hook of the module tracking mode. It never finds anything itself, but
+	drops the indexed entries of a module every time the module is about to be (re)loaded.
+	"""
+	def __init__( self, registry) :
+		self.registry = registry
+	
+	def find_spec( self, fullname, path, target = None) :
+		# frozen registry keeps the entries of the reloaded modules
+		if not self.registry.frozen :
+			self.registry._forget_module( fullname)
+		return None
+
+class _FrozenLock( object) :
+	"""
+	Lock of a frozen registry, see DecoratorRegistry.freeze(). Registry writes are all made
+	holding the lock, so every attempt to change a frozen registry raises RuntimeError.
+	"""
+	def __init__( self, registry) :
+		self.registry = registry
+	
+	def __enter__( self) :
+		raise RuntimeError( "%r is frozen" %( self.registry,))
+	
+	def __exit__( self, *exc_info) :
+		return False
+
+_MAPPINGS = ( dict, types.MappingProxyType)
+
+def _frozen( mapping) :
+	""" Returns the read-only copy of a nested dict """
+	return types.MappingProxyType( dict(
+		( key, _frozen( value) if isinstance( value, dict) else value) for key, value in mapping.items()))
+
+class _registrymethod( object) :
+	"""
+	Decorator of DecoratorRegistry methods. Methods are bound to the registry instance when
+	called on an instance and to the default registry when called on the class itself, so
+	DecoratorRegistry.decorator( fn) is the same as DecoratorRegistry.default.decorator( fn).
+	"""
+	def __init__( self, fn) :
+		self.__func__ = fn
+		self.__name__ = fn.__name__
+		self.__doc__  = fn.__doc__
+	
+	def __get__( self, instance, owner = None) :
+		if instance is None :
+			return getattr( owner.default, self.__name__)
+		
+		# bound methods are cached in the instance dict, so next lookups skip the descriptor
+		method = instance.__dict__[self.__name__] = types.MethodType( self.__func__, instance)
+		return method
+
+class _registryattribute( object) :
+	"""
+	Attribute of DecoratorRegistry instances which reads the attribute of the default registry
+	when accessed on the class, so DecoratorRegistry.generation is the same as
+	DecoratorRegistry.default.generation. Instances keep the value in their own dict, which
+	takes precedence over the descriptor, so instance reads do not pay for it.
+	"""
+	def __init__( self, name) :
+		self.__name__ = name
+	
+	def __get__( self, instance, owner = None) :
+		if instance is None :
+			return getattr( owner.default, self.__name__)
+		
+		raise AttributeError( self.__name__)
 
 class DecoratorRegistry( object) :
 	"""
@@ -36,101 +226,1321 @@ class DecoratorRegistry( object) :
 	::
 		from regd import DecoratorRegisrty
 		
-		# let's assume we have a decorator which do sume stuff and having name "cooldeco"
-		# so we need only to register the decorator function with DecoratorRegistry
-		cooldeco = DecoratorRegistry.decorator( cooldeco)
+		# let's assume we have a decorator which do sume stuff and having name "cooldeco"
+		# so we need only to register the decorator function with DecoratorRegistry
+		cooldeco = DecoratorRegistry.decorator( cooldeco)
+		
+		# now we define a function which will be decorated with "cooldeco"
+		@cooldeco
+		def coolfunc() :
+			# ... do something here ...
+			return "I'm cool!"
+		
+		# Now at any place we can do, for example, such check
+		if DecoratorRegistry.is_decorated_with( coolfunc, cooldeco) :
+			# ... do something usefull ...
+			print( "Yes, it is!")
+		
+	
+	Current implementation does not use inspect module or code parsing, but have some rules and
+	restrictions required to take into account:
+	
+	#. Only registered decorators are possible to track
+	#. It's possible to track third-party decorators, them just required to be registered with
+	   DecoratorRegistry **before** they are used
+	#. Does not matter if registered decorator was used directly (f = d(f)) or by using syntax
+	   sugar (@d) - it will work fine
+	#. It is **not possible to register and track builtin decorators** like **staticmethod** or
+	   **classmethod**.
+	
+	All the methods are available on the DecoratorRegistry class itself, which works with the
+	default registry DecoratorRegistry.default, and on separate registry instances. Each instance
+	is an isolated namespace: it only knows the decorators registered with it and only indexes
+	the functions decorated with them. This keeps the queries of a subsystem small and lets tests
+	use throwaway registries:
+	::
+		web = DecoratorRegistry( 'web')
+		route = web.parametrized_decorator( route)
+		
+		@route( '/users')
+		def users() : pass
+		
+		print( web.functions_decorated_with( route))
+		
+		# the default registry does not know anything about the web decorators
+		print( DecoratorRegistry.is_decorated_with( users, route))
+	
+	A registry sees the wrappers produced by the decorators of another registry as the real
+	functions, so decorators of different registries should not be stacked on the same function
+	when get_real_function() is expected to go through all of them.
+	
+	Registry is safe to use from many threads, including free-threaded Python builds:
+	
+	#. All registry writes (decorator registration, decoration, index updates) are serialized
+	   with a single re-entrant registry lock. Decoration mostly happens at import time, so the
+	   lock is not contended on hot paths.
+	#. Readers never take the lock. Per-function metadata is published as immutable tuples and
+	   ints replaced with a single attribute store, and indexes are only read through atomic
+	   list() copies, so a reader sees either the previous or the next state, never a broken one.
+	
+	:Author: Mykhailo Stadnyk <mikhus@gmail.com>
+	:Version: 1.3.1b
+	"""
+	
+	NATIVE_FUNCTION  = 'native_function'
+	DECORATOR        = 'decorator'
+	DECORATORS       = 'decorators'
+	METHODS_TABLE    = '__decorated_methods__'
+	
+	# number of the collected functions which triggers pruning of the indexes, see prune()
+	PRUNE_THRESHOLD  = 1024
+	
+	# actions of the changes returned by changes_since()
+	ADDED            = 'added'
+	REMOVED          = 'removed'
+	METHODS_REGISTRY = '__decorated_registry__'
+	
+	# number of the last change and frozen flag of the instances, see changes_since() and freeze()
+	generation       = _registryattribute( 'generation')
+	frozen           = _registryattribute( 'frozen')
+	
+	def __init__( self, namespace = None, changelog_size = 10000) :
+		"""
+		:param namespace: optional name of the registry, it's only used for representation
+		:param changelog_size: number of the latest changes kept for changes_since()
+		"""
+		self.namespace = namespace
+		
+		# number of the last change, see changes_since()
+		self.generation = 0
+		self._changes   = collections.deque( maxlen = changelog_size)
+		
+		# lock serializing all the registry writes, see the concurrency model above, and the lock
+		# of the readers which need a consistent view of several structures
+		self._lock      = threading.RLock()
+		self._read_lock = self._lock
+		self.frozen     = False
+		
+		# side table { id( function) : _FunctionRecord } with the metadata of decorated functions
+		# and wrappers. Entries are dropped as soon as the function is garbage collected
+		self._records = {}
+		
+		# legacy mode mirroring the metadata into function __annotations__, see use_annotations()
+		self._annotations = False
+		
+		# module index { module name : { qualified name : weak reference to native function } },
+		# see track_modules()
+		self._modules_index  = {}
+		self._track_modules  = False
+		self._module_tracker = None
+		
+		# interned decorators combinations, so functions decorated the same way share a single
+		# decorators tuple { ( decorators, next decorator ) : ( next decorators, next mask ) }
+		self._combinations = {}
+		
+		# bits assigned to the registered decorators { decorator : 1 << decorator id }
+		self._decorator_bits = {}
+		
+		# parametrized decorators arguments binding { decorator : function( args, kw) -> { name : value } }
+		self._arguments_binders = {}
+		
+		# arguments index { decorator : { parameter name : { value : { id : weak reference to native function } } } }
+		self._arguments_index = {}
+		
+		# reverse index { decorator : { module name : { id : weak reference to native function } } }
+		# filled in by the registered decorators at decoration time
+		self._functions_index = {}
+		
+		# indexes only keep weak references, entries of the collected functions are skipped by
+		# the readers and pruned from time to time, see prune() and stats()
+		self._created   = 0
+		self._pruned    = 0
+		self._pruned_at = 0
+		
+		# hooks of the decorators created with hook_decorator() { decorator : ( before, after, around ) }
+		self._hooks = {}
+		
+		# hook decorators wrappers { wrapper : ( wrapped target, ( ( decorator, before, after, around ), ... ) ) }
+		# with the hooks stack ordered from the outermost one, see hook_decorator()
+		self._fused = weakref.WeakKeyDictionary()
+		
+		# cached callables of get_layer() and bypass() { function : { key : callable } }
+		self._handles = weakref.WeakKeyDictionary()
+		
+		# registered decorators switched off with disable()
+		self._disabled = frozenset()
+		
+		# references rebound by disable() to be restored by enable() { decorator : list of
+		# ( cell or owner, attribute name or None for a cell, original value, replacement ) }
+		self._parked = {}
+		
+		# decoration events subscribers { decorator or None : tuple of callbacks }, see subscribe()
+		self._subscribers = {}
+	
+	def __repr__( self) :
+		return '<%s %r>' %( type( self).__name__, self.namespace)
+	
+	@_registrymethod
+	def use_annotations( this, enabled = True) :
+		"""Turns on/off the legacy annotations compatibility mode
+		
+		By default registry metadata is kept in a side table of the registry and functions
+		are left untouched. In annotations mode the registry additionally mirrors the
+		NATIVE_FUNCTION, DECORATOR and DECORATORS keys into the __annotations__ of the
+		decorated functions as older versions did. It is only intended for code which reads
+		those keys directly and should be turned on before any registered decorator is used.
+		
+		:param enabled: bool flag to turn on/off the annotations mode
+		"""
+		this._annotations = bool( enabled)
+	
+	@_registrymethod
+	def _make_portable( this, fn):
+		""" Private method """
+		if not hasattr( fn, '__annotations__'):
+			setattr( fn, '__annotations__', {})
+		
+		return fn
+
+	@_registrymethod
+	def _getfn( this, fn):
+		""" Private method """
+		if type( fn) in [staticmethod, classmethod, types.MethodType] :
+			fn = fn.__func__
+		return fn
+	
+	@_registrymethod
+	def _get_record( this, fn) :
+		""" Private method """
+		return this._records.get( id( fn))
+	
+	@_registrymethod
+	def _ensure_record( this, fn, wrapper = False) :
+		""" Private method """
+		key     = id( fn)
+		records = this._records
+		record  = records.get( key)
+		
+		if record is not None and ( wrapper or type( record) is not _WrapperRecord) :
+			return record
+		
+		with this._lock :
+			record = records.get( key)
+			
+			if record is not None and ( wrapper or type( record) is not _WrapperRecord) :
+				return record
+			
+			# records are weak references carrying the key, so a single callback serves them all
+			try :
+				new = ( _WrapperRecord if wrapper else _FunctionRecord)( fn, this._forget, key)
+			except TypeError :
+				new = _StrongRecord( fn, None, key)
+			
+			if record is not None :
+				# the wrapper turned out to be a real function, its lighter record is replaced
+				this._link( new, record.native_function, record.native_record)
+				new.decorator = record.decorator
+				# resolution caches holding the replaced record are not trusted anymore
+				record.native_function = fn
+			
+			records[key] = record = new
+			this._created += 1
+		
+		return record
+	
+	@_registrymethod
+	def _forget( this, record) :
+		"""Private method
+		Weak references callback dropping the record of a collected function. It needs no lock:
+		the id can not be reused before the object is freed.
+		"""
+		# dead records of wrappers stay in the layers, they must not keep the real function alive
+		record.native_function = record.native_record = None
+		
+		if this._records.get( record.key) is record :
+			this._records.pop( record.key, None)
+			
+			if record.decorators :
+				this._log_collected( record.key, record)
+	
+	@_registrymethod
+	def _annotate( this, fn, key, value) :
+		""" Private method """
+		if this._annotations :
+			this._make_portable( fn).__annotations__[key] = value
+
+	@_registrymethod
+	def _set_native_function( this, fn, native_fn) :
+		""" Private method """
+		fn = this._getfn( fn)
+		
+		if fn is not native_fn :
+			with this._lock :
+				this._link( this._ensure_record( fn, True), native_fn, this._get_record( native_fn))
+				this._annotate( fn, this.NATIVE_FUNCTION, native_fn)
+	
+	@staticmethod
+	def _link( record, native_fn, native_record) :
+		"""Private method
+		Updates the link of a record. Lock-free readers trust native_record only when it is
+		the same before and after reading native_function, so it's cleared first and set last.
+		"""
+		record.native_record   = None
+		record.native_function = native_fn
+		record.native_record   = native_record
+	
+	@_registrymethod
+	def _resolve( this, fn) :
+		"""Private method
+		Returns the pair ( native function, native function record or None ) for the given
+		function. Resolved link chains are compressed to point at their root and the root
+		record is cached, so repeated resolution takes constant time. The cache is checked
+		to still be a root on every use, so it stays valid when links are added later.
+		"""
+		native_fn = this._getfn( fn)
+		record    = this._records.get( id( native_fn))
+		
+		if record is None or record.native_function is None :
+			return native_fn, record
+		
+		root      = record.native_record
+		native_fn = record.native_function
+		
+		if root is not None and root.native_function is None and record.native_record is root :
+			return native_fn, root
+		
+		chain = []
+		
+		while record is not None and record.native_function is not None :
+			chain.append( record)
+			native_fn = record.native_function
+			record    = this._records.get( id( native_fn))
+		
+		for link in chain :
+			this._link( link, native_fn, record)
+		
+		return native_fn, record
+
+	@_registrymethod
+	def _get_native_function( this, fn) :
+		""" Private method """
+		return this._resolve( fn)[0]
+	
+	@_registrymethod
+	def _set_decorator( this, fn, decorator) :
+		""" Private method """
+		fn = this._getfn( fn)
+		
+		with this._lock :
+			this._ensure_record( fn, True).decorator = decorator
+			this._annotate( fn, this.DECORATOR, decorator)
+	
+	@_registrymethod
+	def _get_decorator( this, fn) :
+		""" Private method """
+		record = this._get_record( this._getfn( fn))
+		
+		if record is None :
+			return None
+		
+		return record.decorator
+	
+	@_registrymethod
+	def _append_decorator( this, fn, decorator):
+		""" Private method """
+		with this._lock :
+			native_fn = this._get_native_function( fn)
+			record    = this._ensure_record( native_fn)
+			
+			if decorator not in record.decorators :
+				key  = ( record.decorators, decorator)
+				step = this._combinations.get( key)
+				
+				if step is None :
+					step = this._combinations[key] = (
+						record.decorators + ( decorator,), record.mask | this._decorator_bits.get( decorator, 0))
+				
+				record.decorators, record.mask = step
+				this._annotate( native_fn, this.DECORATORS, list( record.decorators))
+	
+	@_registrymethod
+	def _register_decorator( this, decorator) :
+		""" Private method """
+		with this._lock :
+			this._decorator_bits[decorator] = 1 << len( this._decorator_bits)
+		
+		return decorator
+	
+	@_registrymethod
+	def _register_arguments( this, decorator, native_parametrized_decorator, index) :
+		""" Private method """
+		try :
+			signature = inspect.signature( native_parametrized_decorator)
+		except ( TypeError, ValueError) :
+			signature = None
+		
+		def bind( args, kw) :
+			if signature is None :
+				return dict( kw)
+			
+			try :
+				bound = signature.bind( *args, **kw)
+			except TypeError :
+				return dict( kw)
+			
+			bound.apply_defaults()
+			arguments = dict( bound.arguments)
+			
+			for name, parameter in signature.parameters.items() :
+				if parameter.kind is parameter.VAR_KEYWORD :
+					arguments.update( arguments.pop( name, {}))
+			
+			return arguments
+		
+		with this._lock :
+			this._arguments_binders[decorator] = bind
+			
+			if index :
+				this._arguments_index[decorator] = dict( ( name, {}) for name in index)
+	
+	@_registrymethod
+	def _append_layer( this, native_fn, decorator, inner, wrapper, args = None, kw = None) :
+		""" Private method """
+		index     = this._arguments_index.get( decorator)
+		arguments = this._arguments_binders[decorator]( args, kw) if index else {}
+		
+		with this._lock :
+			wrapper = this._ensure_record( this._getfn( wrapper), True)
+			record  = this._ensure_record( native_fn)
+			
+			# the function the decorator was applied to is mostly the native function or the
+			# wrapper of the previous layer, their records are the references
+			inner_record = this._get_record( inner)
+			inner_ref    = inner_record if inner_record is not None else _ref( inner)
+			
+			record.layers += ( _Layer( decorator, inner_ref, wrapper, args, kw),)
+			
+			for name, values in ( index or {}).items() :
+				if name not in arguments :
+					continue
+				
+				try :
+					values.setdefault( arguments[name], {})[record.key] = record
+				except TypeError :
+					# unhashable values are only found by find() scanning
+					pass
+	
+	@_registrymethod
+	def get_decorator_arguments( this, fn, decorator) :
+		"""Returns the arguments the given parametrized decorator was applied to a function with
+		
+		:param fn: decorated function
+		:param decorator: registered parametrized decorator
+		:rtype: list of ( args tuple, kwargs dict ) for every application of the decorator
+		"""
+		record = this._resolve( fn)[1]
+		
+		if record is None :
+			return []
+		
+		return [( layer.args, layer.kw) for layer in record.layers
+			if layer.decorator is decorator and layer.args is not None]
+	
+	@_registrymethod
+	def find( this, decorator, **params) :
+		"""Returns functions decorated with a parametrized decorator applied with the given arguments
+		
+		Arguments are matched by the parameter names of the native parametrized decorator, no
+		matter if they were given as positional or keyword arguments, default values are taken
+		into account as well. Parameters listed in the index argument of parametrized_decorator()
+		are looked up in the hash index, so the cost only depends on the size of the result.
+		Other parameters are checked for every function decorated with the decorator.
+		
+		Usage example:
+		::
+			route = DecoratorRegistry.parametrized_decorator( route, index = ( 'path',))
+			
+			@route( '/users', methods = ('GET',))
+			def users() : pass
+			
+			print( DecoratorRegistry.find( route, path = '/users'))
+		
+		:param decorator: registered parametrized decorator
+		:param params: parameter values to look for
+		:rtype: list of real functions decorated with the decorator applied with the given arguments
+		"""
+		index      = this._arguments_index.get( decorator, {})
+		candidates = None
+		scan       = len( params) > 1
+		
+		for name, value in params.items() :
+			if name not in index :
+				scan = True
+				continue
+			
+			try :
+				found = index[name].get( value, {})
+			except TypeError :
+				scan = True
+				continue
+			
+			if candidates is None :
+				candidates = _alive( found)
+			else :
+				candidates = [fn for fn in candidates if id( fn) in found and found[id( fn)]() is fn]
+		
+		if candidates is None :
+			candidates = this.functions_decorated_with( decorator)
+		
+		if not scan :
+			return list( candidates)
+		
+		bind = this._arguments_binders.get( decorator)
+		
+		if bind is None :
+			return []
+		
+		found = []
+		
+		for fn in candidates :
+			for args, kw in this.get_decorator_arguments( fn, decorator) :
+				arguments = bind( args, kw)
+				
+				if all( name in arguments and arguments[name] == value for name, value in params.items()) :
+					found.append( fn)
+					break
+		
+		return found
+	
+	@_registrymethod
+	def subscribe( this, decorator, callback, replay = False) :
+		"""Subscribes a callback to the decoration events of a registered decorator
+		
+		The callback is called right after the decorator is applied to a function, as
+		callback( native_fn, wrapper, decorator, args), where args is the ( args, kwargs ) pair
+		the parametrized decorator was called with or None for primitive decorators. Exceptions
+		raised by callbacks are propagated to the decorated code.
+		
+		It makes possible to maintain routing tables and other derived indexes incrementally
+		instead of scanning the modules after import:
+		::
+			routes = {}
+			
+			def add_route( native_fn, wrapper, decorator, args) :
+				routes[args[0][0]] = wrapper
+			
+			DecoratorRegistry.subscribe( route, add_route, replay = True)
+		
+		:param decorator: registered decorator or None to subscribe to all the decorators
+		:param callback: function to call
+		:param replay: bool flag to call the callback for every application made before subscription
+		:rtype: the callback
+		"""
+		with this._lock :
+			this._subscribers[decorator] = this._subscribers.get( decorator, ()) + ( callback,)
+			
+			if not replay :
+				return callback
+			
+			if decorator is None :
+				decorators = list( this._functions_index)
+			else :
+				decorators = [decorator]
+			
+			events = []
+			
+			for native_fn in dict.fromkeys(
+					fn for d in decorators for fn in this.functions_decorated_with( d)) :
+				for layer in this._resolve( native_fn)[1].layers :
+					if decorator is None or layer.decorator is decorator :
+						args = None if layer.args is None else ( layer.args, layer.kw)
+						events.append( ( native_fn, layer.wrapper(), layer.decorator, args))
+		
+		for event in events :
+			callback( *event)
+		
+		return callback
+	
+	@_registrymethod
+	def unsubscribe( this, decorator, callback) :
+		"""Removes the callback subscribed with subscribe()
+		
+		:param decorator: decorator the callback is subscribed to
+		:param callback: subscribed function
+		"""
+		with this._lock :
+			callbacks = tuple( cb for cb in this._subscribers.get( decorator, ()) if cb is not callback)
+			
+			if callbacks :
+				this._subscribers[decorator] = callbacks
+			else :
+				this._subscribers.pop( decorator, None)
+	
+	@_registrymethod
+	def _notify( this, native_fn, wrapper, decorator, args) :
+		""" Private method """
+		subscribers = this._subscribers
+		
+		for callback in subscribers.get( decorator, ()) + subscribers.get( None, ()) :
+			callback( native_fn, wrapper, decorator, args)
+	
+	@_registrymethod
+	def disable( this, decorator) :
+		"""Switches off a registered decorator at runtime
+		
+		Every layer the decorator added is skipped from now on: references to the wrappers it
+		produced are replaced with the functions it was applied to in the module and class
+		attributes, in the decorated methods tables of DecoratedClass and in the closures of the
+		outer wrappers of the same function. Calls do not pay anything for the disabled layer
+		then. Functions decorated while the decorator is disabled get the layer as usual, since
+		their references are only stored after the decoration. Calling disable() again switches
+		off the layers added since the last call.
+		
+		Registry metadata is not changed, so disabled decorators are still reported by
+		get_decorators() and the other queries.
+		::
+			DecoratorRegistry.disable( trace)
+			
+			# ... under load ...
+			
+			DecoratorRegistry.enable( trace)
+		
+		Only the references the registry knows about are rebound. References to the wrappers
+		kept elsewhere, for example in routing tables built before the call, still go through
+		the disabled layer.
+		
+		:param decorator: registered decorator to switch off
+		:rtype: int - number of rebound references
+		"""
+		with this._lock :
+			this._disabled = this._disabled | frozenset( [decorator])
+			
+			# layers switched off already have no references to their wrappers left to rebind
+			changes = this._parked.setdefault( decorator, [])
+			
+			return this._switch( decorator, False, changes)
+	
+	@_registrymethod
+	def enable( this, decorator) :
+		"""Switches on a registered decorator switched off with disable()
+		
+		Exactly the references disable() rebound are restored, unless they were changed since.
+		
+		:param decorator: registered decorator to switch on
+		:rtype: int - number of rebound references
+		"""
+		with this._lock :
+			if decorator not in this._disabled :
+				return 0
+			
+			this._disabled = this._disabled - frozenset( [decorator])
+			rebound = 0
+			
+			# only the references disable() changed are restored, so other references to the
+			# functions the decorator was applied to are never touched
+			for change in reversed( this._parked.pop( decorator, ())) :
+				rebound += this._restore( change)
+			
+			return rebound + this._switch( decorator, True)
+	
+	@_registrymethod
+	def is_enabled( this, decorator) :
+		"""Checks if a registered decorator is not switched off with disable()
+		
+		:param decorator: registered decorator
+		:rtype: bool
+		"""
+		return decorator not in this._disabled
+	
+	@_registrymethod
+	def _switch( this, decorator, enabled, changes = None) :
+		""" Private method """
+		rebound = 0
+		
+		for native_fn in this.functions_decorated_with( decorator) :
+			layers = this._resolve( native_fn)[1].layers
+			
+			for i, layer in enumerate( layers) :
+				inner, wrapper = layer.inner(), layer.wrapper()
+				fused = this._fused_stack( wrapper)
+				
+				# fused hook wrappers skip the disabled hooks themselves, so they are rebuilt
+				if fused is not None :
+					if any( hooks[0] is decorator for hooks in fused[1]) :
+						rebound += this._rebuild( native_fn, layers, i, fused)
+					continue
+				
+				if enabled or layer.decorator is not decorator :
+					continue
+				
+				if inner is None or wrapper is None or inner is wrapper :
+					continue
+				
+				rebound += this._rebind( native_fn, layers[i + 1:], wrapper, inner, changes)
+		
+		return rebound
+	
+	@_registrymethod
+	def _rebuild( this, native_fn, layers, i, fused) :
+		""" Private method, replaces the fused hooks wrapper of a layer with the new one """
+		layer = layers[i]
+		old   = layer.wrapper()
+		new   = this._hooks_wrapper( fused[0], fused[1], layer.inner())
+		
+		this._set_decorator( new, layer.decorator)
+		this._set_native_function( new, native_fn)
+		layer.wrapper = this._ensure_record( new, True)
+		
+		if i + 1 < len( layers) and layers[i + 1].inner() is old :
+			layers[i + 1].inner = layer.wrapper
+		
+		return this._rebind( native_fn, layers[i + 1:], old, new)
+	
+	@_registrymethod
+	def _restore( this, change) :
+		""" Private method, undoes a single change made by _rebind() unless it was changed again """
+		target, name, original, replacement = change
+		
+		if name is None :
+			try :
+				if target.cell_contents is not replacement :
+					return 0
+			except ValueError :
+				return 0
+			
+			target.cell_contents = original
+		else :
+			if getattr( target, '__dict__', {}).get( name) is not replacement :
+				return 0
+			
+			setattr( target, name, original)
+			this._refresh_methods_tables( target)
+		
+		return 1
+	
+	@_registrymethod
+	def _refresh_methods_tables( this, owner) :
+		""" Private method, rebuilds the decorated methods tables of a class and its subclasses
+		after their attribute was rebound """
+		if not isinstance( owner, type) :
+			return
+		
+		classes = [owner]
+		
+		for cls in classes :
+			if cls.__dict__.get( this.METHODS_REGISTRY) is this :
+				this._build_methods_table( cls)
+			
+			classes.extend( cls.__subclasses__())
+	
+	@_registrymethod
+	def _rebind( this, native_fn, outer_layers, old, new, changes = None) :
+		""" Private method, replaces references to old with new, changes are recorded
+		into the given list so they can be restored, it also keeps old alive """
+		rebound = 0
+		seen    = set( [id( old), id( new)])
+		
+		# closures of the outer wrappers and of the unregistered wrappers between them,
+		# the switched layer's own wrapper closes over the function it was applied to
+		for layer in outer_layers :
+			for fn in ( layer.inner(), layer.wrapper()) :
+				if fn is None or id( fn) in seen :
+					continue
+				
+				seen.add( id( fn))
+				
+				for cell in getattr( fn, '__closure__', None) or () :
+					try :
+						contents = cell.cell_contents
+					except ValueError :
+						continue
+					
+					if contents is old :
+						cell.cell_contents = new
+						rebound += 1
+						
+						if changes is not None :
+							changes.append( ( cell, None, old, new))
+		
+		# module or class attribute the function is defined with
+		module   = sys.modules.get( getattr( native_fn, '__module__', None))
+		qualname = getattr( native_fn, '__qualname__', None)
+		
+		if module is None or qualname is None or '<locals>' in qualname :
+			return rebound
+		
+		owner_name, _, name = qualname.rpartition( '.')
+		owner = this._lookup_qualname( module, owner_name) if owner_name else module
+		value = getattr( owner, '__dict__', {}).get( name)
+		
+		if value is not None and this._getfn( value) is old :
+			if type( value) in [staticmethod, classmethod] :
+				new = type( value)( new)
+			
+			setattr( owner, name, new)
+			this._refresh_methods_tables( owner)
+			rebound += 1
+			
+			if changes is not None :
+				changes.append( ( owner, name, value, new))
+		
+		return rebound
+	
+	@_registrymethod
+	def _fused_stack( this, fn) :
+		""" Private method, returns ( target, hooks stack ) of a hook decorator wrapper or None """
+		try :
+			return this._fused.get( fn)
+		except TypeError :
+			return None
+	
+	@_registrymethod
+	def _fuse( this, decorator, fn, hooks) :
+		""" Private method, wraps fn with the hooks fusing them with the hooks of fn if possible """
+		fused = this._fused_stack( fn)
+		
+		# around hook calls the wrapped function itself, so it's only fused as the innermost one
+		if fused is not None and hooks[2] is None :
+			return this._hooks_wrapper( fused[0], ( ( decorator,) + hooks,) + fused[1], fn)
+		
+		return this._hooks_wrapper( fn, ( ( decorator,) + hooks,), fn)
+	
+	@_registrymethod
+	def _hooks_wrapper( this, target, stack, inner, skip = frozenset()) :
+		""" Private method, generates a single wrapper of target running the enabled hooks of the stack """
+		skip   = this._disabled | skip
+		active = [hooks for hooks in stack if hooks[0] not in skip]
+		
+		wrapper = make_wrapper( target,
+			[hooks[1] for hooks in active if hooks[1] is not None],
+			[hooks[2] for hooks in active if hooks[2] is not None],
+			stack[-1][3] if stack[-1][0] not in skip else None)
+		
+		# keeps the function the outermost hooks were applied to alive for disable() and enable()
+		wrapper.__wrapped__ = inner
+		
+		if not this.frozen :
+			with this._lock :
+				this._fused[wrapper] = ( target, stack)
+		
+		return wrapper
+	
+	@_registrymethod
+	def _segments( this, fn) :
+		""" Private method, returns the call chain of a decorated function from the outermost wrapper
+		as the list of ( callable, decorators, fused stack or None, inner callable ). Wrappers of
+		unregistered decorators are the segments with ( None,) decorators """
+		fn       = this._getfn( fn)
+		segments = []
+		seen     = set()
+		
+		# the registry sees a function wrapped by an unregistered decorator as the native one, so
+		# the chain is made of the layers of several native functions linked by such wrappers
+		while fn is not None and id( fn) not in seen :
+			native_fn, record = this._resolve( fn)
+			layers = record.layers if record is not None else ()
+			
+			# layers[:top] are the ones below the segments found so far
+			top = len( layers)
+			
+			def position( fn) :
+				for i in range( top - 1, -1, -1) :
+					if layers[i].wrapper() is fn :
+						return i
+				return None
+			
+			while fn is not None and fn is not native_fn and id( fn) not in seen :
+				seen.add( id( fn))
+				fused = this._fused_stack( fn)
+				i     = position( fn)
+				
+				if fused is not None :
+					if i is not None :
+						top = max( 0, i - len( fused[1]) + 1)
+					
+					segments.append( ( fn, tuple( hooks[0] for hooks in fused[1]), fused, fused[0]))
+					fn = fused[0]
+				elif i is not None :
+					top   = i
+					layer = layers[i]
+					segments.append( ( fn, ( layer.decorator,), None, layer.inner()))
+					fn = layer.inner()
+				else :
+					# unregistered wrapper between the layers, it wraps either what it refers to
+					# or the wrapper of the next registered layer
+					inner = this._unwrap( fn)
+					
+					if inner is None :
+						inner = layers[top - 1].wrapper() if top else native_fn
+					
+					segments.append( ( fn, ( None,), None, inner))
+					fn = inner
+			
+			if fn is None or id( fn) in seen :
+				break
+			
+			seen.add( id( fn))
+			inner = this._unwrap( fn)
+			
+			if inner is None :
+				break
+			
+			segments.append( ( fn, ( None,), None, inner))
+			fn = inner
+		
+		# unregistered wrappers below the last registered layer are the part of the function
+		while segments and segments[-1][1] == ( None,) :
+			segments.pop()
+		
+		return segments
+	
+	@_registrymethod
+	def _unwrap( this, fn) :
+		""" Private method, returns the function an unregistered wrapper wraps if it's known: the
+		one functools.wraps() set or the only registered wrapper it closes over """
+		inner = getattr( fn, '__wrapped__', None)
+		
+		if inner is not None :
+			return inner
+		
+		known = []
+		
+		for cell in getattr( fn, '__closure__', None) or () :
+			try :
+				contents = cell.cell_contents
+			except ValueError :
+				continue
+			
+			record = this._get_record( this._getfn( contents))
+			
+			# only the wrappers, native functions closed over may be just called
+			if record is not None and record.native_function is not None :
+				known.append( contents)
+		
+		return known[0] if len( known) == 1 else None
+	
+	@_registrymethod
+	def _handle( this, fn, key, build) :
+		""" Private method, returns the cached callable of get_layer() and bypass() building it if needed """
+		fn  = this._getfn( fn)
+		key = key + ( this._disabled,)
+		
+		try :
+			handles = this._handles.get( fn)
+		except TypeError :
+			# not weak referenceable functions are not cached
+			return build()
+		
+		if handles is not None and key in handles :
+			return handles[key]
+		
+		handle = build()
+		
+		# the handle referring to fn itself would keep the weak key alive
+		if handle is not fn and not this.frozen :
+			with this._lock :
+				this._handles.setdefault( fn, {})[key] = handle
+		
+		return handle
+	
+	@_registrymethod
+	def freeze( this) :
+		"""Makes the registry read-only and prepares it to be shared by forked processes
+		
+		It's intended for prefork servers populating the registry in the master process:
+		::
+			import gc
+			
+			import myapp.views
+			
+			DecoratorRegistry.freeze()
+			gc.freeze()
+			
+			# ... fork the workers ...
+		
+		All the lazy work queries do is done right away: function links are resolved and bound
+		methods of the registry are created, so queries do not write to the shared memory pages
+		anymore. Indexes are compacted into the read-only copies. Any later registry change,
+		like decoration with a registered decorator, decorator registration, disable() or
+		subscribe(), raises RuntimeError.
+		
+		Queries still change the reference counts of the objects they return, that's what CPython
+		does with every object in use.
+		
+		:rtype: the registry
+		"""
+		with this._lock :
+			for record in list( this._records.values()) :
+				fn = record()
+				
+				if fn is not None and record.native_function is not None :
+					this._resolve( fn)
+			
+			for cls in type( this).__mro__ :
+				for name, attr in list( vars( cls).items()) :
+					if isinstance( attr, _registrymethod) and name not in this.__dict__ :
+						getattr( this, name)
+			
+			for name in ( '_functions_index', '_modules_index', '_arguments_index', '_decorator_bits',
+			              '_combinations', '_arguments_binders', '_hooks', '_subscribers', '_parked') :
+				setattr( this, name, _frozen( getattr( this, name)))
+			
+			this._read_lock = contextlib.nullcontext()
+			this._lock      = _FrozenLock( this)
+			this.frozen     = True
+		
+		return this
+	
+	@_registrymethod
+	def prune( this) :
+		"""Drops the index entries of the garbage collected functions
+		
+		Registry only keeps weak references to the decorated functions and the side table
+		entries are dropped as soon as a function is collected. Index entries of the collected
+		functions are skipped by the queries and pruned automatically on decoration once enough
+		functions were collected, so there is no need to call it unless the memory should be
+		released right away.
+		
+		:rtype: int - number of the dropped index entries
+		"""
+		def prune_refs( refs) :
+			dead = [key for key, ref in list( refs.items()) if ref() is None]
+			for key in dead :
+				del refs[key]
+			return len( dead)
+		
+		def prune_nested( index) :
+			pruned = 0
+			for key, value in list( index.items()) :
+				if isinstance( value, dict) :
+					pruned += prune_nested( value)
+					if not value :
+						del index[key]
+				elif value() is None :
+					del index[key]
+					pruned += 1
+			return pruned
+		
+		with this._lock :
+			pruned = 0
+			
+			for modules in this._functions_index.values() :
+				for name, fns in list( modules.items()) :
+					pruned += prune_refs( fns)
+					if not fns :
+						del modules[name]
+			
+			pruned += prune_nested( this._modules_index)
+			
+			for parameters in this._arguments_index.values() :
+				for values in parameters.values() :
+					pruned += prune_nested( values)
+			
+			this._pruned   += pruned
+			this._pruned_at = this._created - len( this._records)
+		
+		return pruned
+	
+	@_registrymethod
+	def stats( this) :
+		"""Returns the lifecycle statistics of the registry entries
+		
+		Long running processes decorating functions created on the fly can watch it to make sure
+		the registry does not grow: live should stay flat while collected grows.
+		
+		:rtype: dict with live - number of the functions and wrappers with the registry metadata,
+		        collected - number of them garbage collected so far, indexed - number of the index
+		        entries of the live functions, stale - number of the index entries of the collected
+		        functions not pruned yet and pruned - number of the pruned index entries
+		"""
+		def count( index, counts) :
+			for value in list( index.values()) :
+				if isinstance( value, _MAPPINGS) :
+					count( value, counts)
+				else :
+					counts[value() is None] += 1
+			return counts
+		
+		with this._read_lock :
+			counts = [0, 0]
+			count( this._functions_index, counts)
+			count( this._modules_index, counts)
+			count( this._arguments_index, counts)
+			
+			return {
+				'live'      : len( this._records),
+				'collected' : this._created - len( this._records),
+				'indexed'   : counts[0],
+				'stale'     : counts[1],
+				'pruned'    : this._pruned,
+			}
+	
+	@_registrymethod
+	def memory_usage( this) :
+		"""Returns the number of bytes the registry metadata takes
+		
+		Objects shared between functions, like the interned decorators combinations, are counted
+		once. Functions, wrappers and decorators themselves are not counted, only what the
+		registry keeps about them. Sizes are shallow sizes from sys.getsizeof(), so they are
+		a bit less than the real ones taken by the allocator.
+		
+		:rtype: dict { part : bytes } with records, decorators, layers, indexes and total parts
+		        and combinations - the number of distinct decorators combinations
+		"""
+		seen = set()
+		
+		def size( *objects) :
+			total = 0
+			for obj in objects :
+				if obj is not None and id( obj) not in seen :
+					seen.add( id( obj))
+					total += sys.getsizeof( obj)
+			return total
+		
+		def nested( obj) :
+			total = size( obj)
+			# read-only copies of a frozen registry are counted by the size of the dict they wrap
+			if isinstance( obj, types.MappingProxyType) :
+				total += sys.getsizeof( dict( obj))
+			for value in list( obj.values()) :
+				if isinstance( value, _MAPPINGS) :
+					total += nested( value)
+			return total
+		
+		with this._read_lock :
+			records = list( this._records.values())
+			usage   = dict.fromkeys( ['records', 'decorators', 'layers', 'indexes'], 0)
+			
+			usage['records'] += size( this._records)
+			
+			for record in records :
+				usage['records']    += size( record)
+				usage['decorators'] += size( record.decorators)
+				usage['layers']     += size( record.layers)
+				
+				for layer in record.layers :
+					usage['layers'] += size( layer, layer.args, layer.kw)
+					
+					# records are counted as records
+					if not isinstance( layer.inner, ( _FunctionRecord, _WrapperRecord, _StrongRecord)) :
+						usage['layers'] += size( layer.inner)
+			
+			usage['decorators'] += size( this._combinations, this._decorator_bits)
+			
+			for key, step in list( this._combinations.items()) :
+				usage['decorators'] += size( key, step, step[0])
+			
+			for index in ( this._functions_index, this._modules_index, this._arguments_index) :
+				usage['indexes'] += nested( index)
+			
+			usage['total']        = sum( usage.values())
+			usage['combinations'] = len( set( map( id, ( record.decorators for record in records))))
+		
+		return usage
+	
+	@_registrymethod
+	def _mask( this, decorators) :
+		""" Private method """
+		mask = 0
 		
-		# now we define a function which will be decorated with "cooldeco"
-		@cooldeco
-		def coolfunc() :
-			# ... do something here ...
-			return "I'm cool!"
+		for decorator in decorators :
+			bit = this._decorator_bits.get( decorator)
+			
+			if bit is None :
+				return None
+			
+			mask |= bit
 		
-		# Now at any place we can do, for example, such check
-		if DecoratorRegistry.is_decorated_with( coolfunc, cooldeco) :
-			# ... do something usefull ...
-			print( "Yes, it is!")
+		return mask
+	
+	@_registrymethod
+	def _get_mask( this, fn) :
+		""" Private method """
+		record = this._resolve( fn)[1]
 		
+		if record is None :
+			return 0
+		
+		return record.mask
 	
-	Current implementation does not use inspect module or code parsing, but have some rules and
-	restrictions required to take into account:
+	@_registrymethod
+	def _index_function( this, native_fn, decorator) :
+		""" Private method """
+		module   = getattr( native_fn, '__module__', None)
+		qualname = getattr( native_fn, '__qualname__', None)
+		
+		with this._lock :
+			record  = this._ensure_record( native_fn)
+			modules = this._functions_index.setdefault( decorator, {})
+			
+			record.module, record.qualname = module, qualname
+			fns     = modules.setdefault( module, {})
+			
+			# the id of a collected function may be reused before its entry is pruned
+			if fns.get( record.key, _dead)() is not native_fn :
+				fns[record.key] = record
+				this._log_change( this.ADDED, native_fn, decorator)
+			
+			# functions reachable from the module namespace are indexed by their qualified name
+			if qualname is not None and '<locals>' not in qualname :
+				this._modules_index.setdefault( module, {})[qualname] = record
+			
+			collected = this._created - len( this._records)
+			
+			if collected - this._pruned_at > max( this.PRUNE_THRESHOLD, len( this._records) // 4) :
+				this.prune()
 	
-	#. Only registered decorators are possible to track
-	#. It's possible to track third-party decorators, them just required to be registered with
-	   DecoratorRegistry **before** they are used
-	#. Does not matter if registered decorator was used directly (f = d(f)) or by using syntax
-	   sugar (@d) - it will work fine
-	#. It is **not possible to register and track builtin decorators** like **staticmethod** or
-	   **classmethod**.
+	@_registrymethod
+	def _forget_module( this, name) :
+		""" Private method """
+		with this._lock :
+			this._modules_index.pop( name, None)
+			
+			for decorator, modules in this._functions_index.items() :
+				fns = modules.pop( name, {})
+				
+				for native_fn in _alive( fns) :
+					this._log_change( this.REMOVED, native_fn, decorator)
+				
+				# otherwise find() keeps returning the functions of the module before reload
+				for values in this._arguments_index.get( decorator, {}).values() :
+					for value, refs in list( values.items()) :
+						for key in fns :
+							refs.pop( key, None)
+						if not refs :
+							del values[value]
 	
-	:Author: Mykhailo Stadnyk <mikhus@gmail.com>
-	:Version: 1.3.1b
-	"""
+	@_registrymethod
+	def _log_change( this, action, native_fn, decorator) :
+		""" Private method, should be called with the registry lock held """
+		this.generation += 1
+		this._changes.append( ( this.generation, action, this._ensure_record( native_fn), decorator,
+			getattr( native_fn, '__module__', None), getattr( native_fn, '__qualname__', None)))
 	
-	NATIVE_FUNCTION = 'native_function'
-	DECORATOR       = 'decorator'
-	DECORATORS      = 'decorators'
+	@_registrymethod
+	def _log_collected( this, key, record) :
+		""" Private method, logs the removal of the decorations of a garbage collected function
+		which are still in the indexes """
+		if this.frozen :
+			return
+		
+		with this._lock :
+			for decorator in record.decorators :
+				if this._functions_index.get( decorator, {}).get( record.module, {}).get( key) is record :
+					this.generation += 1
+					this._changes.append( ( this.generation, this.REMOVED, record, decorator,
+						record.module, record.qualname))
 	
-	@classmethod
-	def _make_portable( this, fn):
-		""" Private method """
-		if not hasattr( fn, '__annotations__'):
-			setattr( fn, '__annotations__', {})
+	@_registrymethod
+	def changes_since( this, generation) :
+		"""Returns the decorations added or removed after the given registry generation
 		
-		return fn
-
-	@classmethod
-	def _getfn( this, fn):
-		""" Private method """
-		if type( fn) in [staticmethod, classmethod] :
-			fn = fn.__func__
-		return this._make_portable( fn)
-
-	@classmethod
-	def _set_native_function( this, fn, native_fn) :
-		""" Private method """
-		fn = this._getfn( fn)
-		fn.__annotations__[this.NATIVE_FUNCTION] = native_fn
-
-	@classmethod
-	def _get_native_function( this, fn) :
-		""" Private method """
-		native_fn = this._getfn( fn)
+		Every decoration made with a registered decorator and every decoration dropped from the
+		indexes (when its module is reloaded in module tracking mode or the function is garbage
+		collected) increments the registry generation. Caches derived from the registry can store the generation they were built at,
+		revalidate by comparing it with DecoratorRegistry.generation and apply the deltas:
+		::
+			generation = DecoratorRegistry.generation
+			table = build_table()
+			
+			# later
+			if generation != DecoratorRegistry.generation :
+				changes = DecoratorRegistry.changes_since( generation)
+				
+				if changes is None :
+					generation = DecoratorRegistry.generation
+					table = build_table()
+				else :
+					for change in changes :
+						if change.action == DecoratorRegistry.ADDED :
+							add_to_table( table, change.function, change.decorator)
+						else :
+							remove_from_table( table, change.module, change.qualname, change.decorator)
+						generation = change.generation
+		
+		Only the latest changelog_size changes are kept, when older ones are requested None is
+		returned and the caller should rebuild everything.
 		
-		while this.NATIVE_FUNCTION in native_fn.__annotations__ :
-			native_fn = native_fn.__annotations__[this.NATIVE_FUNCTION]
+		:param generation: registry generation the caller is up to date with
+		:rtype: list of Change( generation, action, function, decorator, module, qualname ) or None
+		        if the changes are not available anymore. function is the real function or None
+		        if it was garbage collected
+		"""
+		changes = list( this._changes)
+		
+		if not changes :
+			return [] if generation >= this.generation else None
+		
+		start = generation - changes[0][0] + 1
+		
+		if start < 0 :
+			return None
 		
-		return native_fn
+		return [_Change( g, action, ref(), decorator, module, qualname)
+			for g, action, ref, decorator, module, qualname in changes[start:]]
 	
-	@classmethod
-	def _set_decorator( this, fn, decorator) :
-		""" Private method """
-		fn = this._getfn( fn)
-		fn.__annotations__[this.DECORATOR] = decorator
+	@_registrymethod
+	def track_modules( this, enabled = True) :
+		"""Turns on/off the module tracking mode
+		
+		Registered decorators always record the functions they decorate under the module name
+		and qualified name of the function. In module tracking mode all_decorated_module_functions()
+		and module_functions_decorated_with() read those records instead of scanning dir() of the
+		module and its classes, so the cost of the query only depends on the number of decorated
+		functions. A sys.meta_path hook is installed as well, which drops the records of a module
+		when it is (re)loaded, so importlib.reload() swaps in the fresh entries.
+		
+		Note that in this mode only functions defined in the module are found, functions
+		imported from other modules are reported by the modules they are defined in.
+		
+		:param enabled: bool flag to turn on/off the module tracking mode
+		"""
+		with this._lock :
+			if this._module_tracker in sys.meta_path :
+				sys.meta_path.remove( this._module_tracker)
+			
+			this._track_modules = bool( enabled)
+			
+			if this._track_modules :
+				this._module_tracker = _ModuleTracker( this)
+				sys.meta_path.insert( 0, this._module_tracker)
+			else :
+				this._module_tracker = None
 	
-	@classmethod
-	def _get_decorator( this, fn) :
+	@_registrymethod
+	def _lookup_qualname( this, module, qualname) :
 		""" Private method """
-		fn = this._getfn( fn)
-		decorator = None
+		fn = module
 		
-		if this.DECORATOR in fn.__annotations__ :
-			decorator = fn.__annotations__[this.DECORATOR]
+		for name in qualname.split( '.') :
+			fn = getattr( fn, '__dict__', {}).get( name)
+			
+			if fn is None :
+				break
 		
-		return decorator
+		return fn
 	
-	@classmethod
-	def _append_decorator( this, fn, decorator):
+	@_registrymethod
+	def _indexed_module_functions( this, module, decorator, exclude_methods, exclude_functions) :
 		""" Private method """
-		native_fn = this._get_native_function( fn)
-		
-		if this.DECORATORS not in native_fn.__annotations__ :
-			native_fn.__annotations__[this.DECORATORS] = []
+		if decorator is None :
+			entries = [( qualname, ref()) for qualname, ref in list(
+				this._modules_index.get( module.__name__, {}).items()) if ref() is not None]
+		else :
+			entries = [( getattr( native_fn, '__qualname__', ''), native_fn)
+				for native_fn in this.functions_decorated_with( decorator, module)]
 		
-		if decorator not in native_fn.__annotations__[this.DECORATORS]:
-			native_fn.__annotations__[this.DECORATORS] += [decorator]
+		for qualname, native_fn in entries :
+			if ( exclude_methods if '.' in qualname else exclude_functions) :
+				continue
+			
+			fn = this._lookup_qualname( module, qualname)
+			
+			# skip the functions which were removed or replaced in the module since decoration
+			if fn is not None and this._get_native_function( fn) is native_fn :
+				yield { qualname : fn }
 	
-	@classmethod
+	@_registrymethod
 	def get_real_function( this, fn):
 		"""Returns the reference to the real function which was decorated
 		and bypasses as fn argument to this method
@@ -140,7 +1550,7 @@ class DecoratorRegistry( object) :
 		"""
 		return this._get_native_function(fn)
 	
-	@classmethod
+	@_registrymethod
 	def get_decorators( this, fn) :
 		"""Returns list of registered decorators for the given function
 		
@@ -165,18 +1575,102 @@ class DecoratorRegistry( object) :
 			print( DecoratorRegistry.get_decorators( myfunc))
 		
 		:param fn: function to extract the decorators
-		:rtype: list of dict {decoratorname : decoratorfunction} contains found decorators
+		:rtype: tuple of registered decorators in the order they were applied
+		"""
+		record = this._resolve( fn)[1]
+		
+		if record is None :
+			return ()
+		
+		return record.decorators
+	
+	@_registrymethod
+	def get_layer( this, fn, decorator) :
+		"""Returns the callable which enters the call chain of a decorated function at the layer
+		of the given decorator, so the outer layers are skipped
+		
+		The callable is found once and cached, so a caller may ask for it every time or keep it.
+		Layers of fused hook decorators get a wrapper generated without the outer hooks.
+		
+		:param fn: decorated function
+		:param decorator: registered decorator
+		:rtype: callable or None if the function call chain has no layer of the decorator
+		"""
+		def build() :
+			for callable_, decorators, fused, inner in this._segments( fn) :
+				if decorator not in decorators :
+					continue
+				
+				if fused is None or decorators[0] is decorator :
+					return callable_
+				
+				stack = fused[1][decorators.index( decorator):]
+				return this._hooks_wrapper( fused[0], stack, fused[0])
+			
+			return None
+		
+		return this._handle( fn, ( 'layer', decorator), build)
+	
+	@_registrymethod
+	def bypass( this, fn, *decorators) :
+		"""Returns the callable of a decorated function which skips the layers of the given decorators
+		
+		It's intended for trusted internal callers which do not need some outer layers like auth
+		or rate limiting. The callable is computed once and cached, so it does not check anything
+		on every call:
+		::
+			users = DecoratorRegistry.bypass( views.users, auth, rate_limit)
+			
+			for request in batch :
+				users( request)
+		
+		Skipped layers should be the outermost ones: a layer is only possible to skip when all the
+		layers above it are skipped as well, since their wrappers call it directly. Consecutive
+		fused hook decorator layers are the exception, their wrapper is generated again without
+		the skipped hooks. Layers of unregistered decorators are never skipped, so the registered
+		layers below them can't be skipped either.
+		
+		:param fn: decorated function
+		:param decorators: registered decorators which layers to skip
+		:rtype: callable
+		:raise ValueError: if some layer to skip is wrapped by a layer which is not skipped or
+		                   is not found in the call chain of the function
 		"""
-		native_fn = this._get_native_function( fn)
-		decorators = []
+		skip = frozenset( decorators)
 		
-		if this.DECORATORS in native_fn.__annotations__ :
-			decorators = native_fn.__annotations__[this.DECORATORS]
+		def build() :
+			segments = this._segments( fn)
+			skipped  = skip | this._disabled
+			i = 0
+			
+			for decorator in skip.difference( *[decorators for _, decorators, _, _ in segments]) :
+				raise ValueError( "%s layer of %r is not found in its call chain" %(
+					getattr( decorator, '__name__', decorator), fn))
+			
+			while i < len( segments) and all( decorator in skipped for decorator in segments[i][1]) :
+				i += 1
+			
+			if i == len( segments) :
+				return segments[-1][3] if segments else this._getfn( fn)
+			
+			# disabled layers are already skipped by the outer wrappers
+			for _, decorators, _, _ in segments[i + 1:] :
+				for decorator in decorators :
+					if decorator in skip and decorator not in this._disabled :
+						raise ValueError( "%s layer of %r is wrapped by a layer which is not skipped" %(
+							getattr( decorator, '__name__', decorator), fn))
+			
+			callable_, decorators, fused, _ = segments[i]
+			
+			if fused is not None and skip.intersection( decorators) :
+				return this._hooks_wrapper( fused[0], fused[1], fused[0], skip)
+			
+			return callable_
 		
-		return decorators
+		return this._handle( fn, ( 'bypass', skip), build)
 	
-	@classmethod
-	def decorator( this, native_decorator) :
+	@_registrymethod
+	def decorator( this, native_decorator, metrics = None) :
 		"""Register primitive decorator
 		The primitive decorator is a decorator is a usual decorator which takes only decorating
 		function as an argument
@@ -198,27 +1692,39 @@ class DecoratorRegistry( object) :
 			# registering decorator function with DecoratorRegistry
 			my_decorator = DecoratorRegistry.decorator( my_decorator)
 		
+		When metrics is given, every wrapper the decorator produces counts its calls, errors and
+		sampled latency, see regd.metrics.CallMetrics.
+		
 		:param native_decorator: real decorator function to register
+		:param metrics: optional CallMetrics instance to instrument the wrappers with
 		:rtype: new decorator function to replace the native one 
 		"""
 		def new_decorator( fn) :
 			fn_decorator = native_decorator( fn)
 			native_fn    = this._get_native_function( fn)
 			
+			if metrics is not None :
+				fn_decorator = metrics.instrument( native_fn, new_decorator, fn_decorator)
+			
+			this._append_decorator( native_fn, new_decorator)
 			this._set_decorator( fn_decorator, new_decorator)
 			this._set_native_function( fn_decorator, native_fn)
-			this._set_native_function( new_decorator, native_fn)
-			this._append_decorator( native_fn, new_decorator)
+			this._append_layer( native_fn, new_decorator, fn, fn_decorator)
+			this._index_function( native_fn, new_decorator)
+			
+			if this._subscribers :
+				this._notify( native_fn, fn_decorator, new_decorator, None)
 			
 			return fn_decorator
 		
 		new_decorator.__name__ = native_decorator.__name__
 		new_decorator.__doc__  = native_decorator.__doc__
 		
-		return new_decorator
+		return this._register_decorator( new_decorator)
 	
-	@classmethod
-	def parametrized_decorator( this, native_parametrized_decorator) :
+	@_registrymethod
+	def parametrized_decorator( this, native_parametrized_decorator, cache_size = None, index = (),
+	                            metrics = None) :
 		"""Register parametrized decorator
 		The parametrized decorator is a decorator which is able to take an arguments
 		So it looks like @mydecorator(param1=True,param2=False)
@@ -248,20 +1754,50 @@ class DecoratorRegistry( object) :
 			# registering decorator function with DecoratorRegistry
 			my_decorator = DecoratorRegistry.parametrized_decorator( my_decorator)
 		
+		When cache_size is given, decorator instances are interned: calls with equal hashable
+		arguments return the same decorator instance from a bounded LRU cache instead of calling
+		the native decorator again. The native decorator should be free of side effects then.
+		The returned function gets functools-like cache_info() and cache_clear() functions and
+		cache_evict( *args, **kw) which drops a single instance.
+		::
+			route = DecoratorRegistry.parametrized_decorator( route, cache_size = 1024)
+			
+			@route( methods = ('GET',))
+			def users() : pass
+			
+			print( route.cache_info())
+		
+		Arguments of every application are recorded on the decorated function and are available
+		with get_decorator_arguments(). Parameter names listed in index are indexed by value,
+		so find() looks them up in constant time.
+		
+		When metrics is given, every wrapper the decorator produces counts its calls, errors and
+		sampled latency, see regd.metrics.CallMetrics.
+		
 		:param native_parametrized_decorator: real decorator function to register
+		:param cache_size: max number of interned decorator instances, None to turn interning off
+		:param index: names of the native decorator parameters to index by value
+		:param metrics: optional CallMetrics instance to instrument the wrappers with
 		:rtype: new parametrized decorator function to replace the native one 
 		"""
-		def new_parametrized_decorator( *args, **kw) :
+		def make_decorator( args, kw) :
 			native_decorator = native_parametrized_decorator( *args, **kw)
 			
 			def new_decorator( fn) :
 				fn_decorator = native_decorator( fn)
 				native_fn    = this._get_native_function( fn)
 				
+				if metrics is not None :
+					fn_decorator = metrics.instrument( native_fn, new_parametrized_decorator, fn_decorator)
+				
+				this._append_decorator( native_fn, new_parametrized_decorator)
 				this._set_decorator( fn_decorator, new_decorator)
 				this._set_native_function( fn_decorator, native_fn)
-				this._set_native_function( new_parametrized_decorator, native_fn)
-				this._append_decorator( native_fn, new_parametrized_decorator)
+				this._append_layer( native_fn, new_parametrized_decorator, fn, fn_decorator, args, kw)
+				this._index_function( native_fn, new_parametrized_decorator)
+				
+				if this._subscribers :
+					this._notify( native_fn, fn_decorator, new_parametrized_decorator, ( args, kw))
 				
 				return fn_decorator
 				
@@ -270,12 +1806,142 @@ class DecoratorRegistry( object) :
 			
 			return new_decorator
 		
+		if not cache_size :
+			def new_parametrized_decorator( *args, **kw) :
+				return make_decorator( args, kw)
+		else :
+			cache = collections.OrderedDict()
+			stats = [0, 0]
+			lock  = threading.Lock()
+			
+			# equal values of different types like 1 and True may produce different decorators,
+			# so the types of all the values, nested ones included, are the part of the key
+			def typed( value) :
+				if type( value) in [tuple, frozenset] :
+					return ( type( value), type( value)( map( typed, value)))
+				return ( type( value), value)
+			
+			def cache_key( args, kw) :
+				key = ( tuple( map( typed, args)), tuple( sorted( ( name, typed( value)) for name, value in kw.items())))
+				hash( key)
+				return key
+			
+			def new_parametrized_decorator( *args, **kw) :
+				try :
+					key = cache_key( args, kw)
+				except TypeError :
+					# unhashable arguments are never interned
+					return make_decorator( args, kw)
+				
+				with lock :
+					new_decorator = cache.get( key)
+					
+					if new_decorator is not None :
+						cache.move_to_end( key)
+						stats[0] += 1
+						return new_decorator
+				
+				new_decorator = make_decorator( args, kw)
+				
+				with lock :
+					# another thread could have interned an instance meanwhile
+					new_decorator = cache.setdefault( key, new_decorator)
+					cache.move_to_end( key)
+					stats[1] += 1
+					
+					while len( cache) > cache_size :
+						cache.popitem( last = False)
+				
+				return new_decorator
+			
+			def cache_info() :
+				return _CacheInfo( stats[0], stats[1], cache_size, len( cache))
+			
+			def cache_clear() :
+				with lock :
+					cache.clear()
+					stats[:] = [0, 0]
+			
+			def cache_evict( *args, **kw) :
+				try :
+					key = cache_key( args, kw)
+				except TypeError :
+					return False
+				
+				with lock :
+					return cache.pop( key, None) is not None
+			
+			new_parametrized_decorator.cache_info  = cache_info
+			new_parametrized_decorator.cache_clear = cache_clear
+			new_parametrized_decorator.cache_evict = cache_evict
+		
 		new_parametrized_decorator.__name__ = native_parametrized_decorator.__name__
 		new_parametrized_decorator.__doc__  = native_parametrized_decorator.__doc__
 		
-		return new_parametrized_decorator
+		this._register_arguments( new_parametrized_decorator, native_parametrized_decorator, index)
+		
+		return this._register_decorator( new_parametrized_decorator)
+	
+	@_registrymethod
+	def hook_decorator( this, before = None, after = None, around = None, name = None, metrics = None) :
+		"""Creates and registers a decorator out of the hook functions
+		
+		Wrappers of the hook decorators are generated with the exact signature of the decorated
+		function and forward the arguments the same way they are declared, so the calls do not
+		pack and unpack *args and **kwargs like the usual def wrapper( *args, **kwargs) does.
+		Wrapper code is generated once per signature shape and reused then, see regd.hooks.
+		
+		Consecutive layers of hook decorators are fused: a hook decorator applied to the wrapper
+		of another one produces a single wrapper running the hooks of both, so a function with
+		several hook decorators costs one call frame. An around hook is only fused as the
+		innermost one. Fused layers are still reported by get_decorators() and the other queries
+		as usual and disable() rebuilds the fused wrappers without the disabled hooks. Wrappers
+		instrumented with metrics are never fused.
+		
+		Usage example:
+		::
+			from regd import DecoratorRegisrty
+			
+			def check( request, *args) :
+				if not request.user :
+					raise Forbidden()
+			
+			auth = DecoratorRegistry.hook_decorator( before = check, name = 'auth')
+			
+			@auth
+			def users( request, page = 1) : pass
+		
+		:param before: optional hook called with the arguments of the call before the function
+		:param after: optional hook called with the result of the function returning the new one
+		:param around: optional hook called instead of the function as around( fn, *args, **kwargs)
+		:param name: decorator name, the name of the first given hook by default
+		:param metrics: optional CallMetrics instance to instrument the wrappers with
+		:rtype: registered decorator function
+		"""
+		hooks = ( before, after, around)
+		
+		if hooks == ( None, None, None) :
+			raise ValueError( "at least one of before, after or around hooks is required")
+		
+		befores = () if before is None else ( before,)
+		afters  = () if after is None else ( after,)
+		
+		def hook_decorator( fn) :
+			if metrics is not None :
+				return make_wrapper( fn, befores, afters, around)
+			
+			return this._fuse( decorator, fn, hooks)
+		
+		hook_decorator.__name__ = name or next( hook for hook in hooks if hook is not None).__name__
+		
+		decorator = this.decorator( hook_decorator, metrics)
+		
+		with this._lock :
+			this._hooks[decorator] = hooks
+		
+		return decorator
 	
-	@classmethod
+	@_registrymethod
 	def is_decorated_with( this, fn, decorator) :
 		"""Checks if a given function decorated with the given decorator
 		
@@ -309,9 +1975,193 @@ class DecoratorRegistry( object) :
 		:param decorator: decorator function to check with
 		:rtype: bool  
 		"""
-		return decorator in  this.get_decorators( fn)
+		bit = this._decorator_bits.get( decorator)
+		
+		if bit is None :
+			return False
+		
+		return this._get_mask( fn) & bit != 0
+	
+	@_registrymethod
+	def is_decorated_with_all( this, fn, *decorators) :
+		"""Checks if a given function decorated with every of the given decorators
+		
+		Each registered decorator owns a bit and every decorated function carries the mask
+		of its decorators, so the check is a single bit operation. It's easy to combine
+		with the other checks, for example to find public but not internal handlers:
+		::
+			public_only = DecoratorRegistry.is_decorated_with_all( handler, public) and (
+				not DecoratorRegistry.is_decorated_with_any( handler, internal))
+		
+		:param fn: function to check
+		:param decorators: decorator functions to check with
+		:rtype: bool
+		"""
+		mask = this._mask( decorators)
+		
+		if mask is None :
+			return False
+		
+		return this._get_mask( fn) & mask == mask
+	
+	@_registrymethod
+	def is_decorated_with_any( this, fn, *decorators) :
+		"""Checks if a given function decorated with at least one of the given decorators
+		
+		:param fn: function to check
+		:param decorators: decorator functions to check with
+		:rtype: bool
+		"""
+		mask = 0
+		
+		for decorator in decorators :
+			mask |= this._decorator_bits.get( decorator, 0)
+		
+		return this._get_mask( fn) & mask != 0
+	
+	@_registrymethod
+	def functions_decorated_with( this, decorator, module = None) :
+		"""Returns the list of real functions decorated with the given registered decorator
+		
+		Unlike module_functions_decorated_with() this method does not scan anything. It reads
+		the reverse index which registered decorators fill in at decoration time, so the cost
+		is proportional to the size of the result and not to the size of the modules.
+		
+		Usage example:
+		::
+			from regd import DecoratorRegisrty
+			
+			import somedecomodule
+			import somemodule
+			
+			# all functions and methods decorated with deco1 in the whole process
+			print( DecoratorRegistry.functions_decorated_with( somedecomodule.deco1))
+			
+			# only those defined in somemodule
+			print( DecoratorRegistry.functions_decorated_with( somedecomodule.deco1, somemodule))
+		
+		:param decorator: registered decorator function
+		:param module: optional module object or module name to filter the result with
+		:rtype: list of real (not decorated) functions in decoration order
+		"""
+		modules = this._functions_index.get( decorator)
+		
+		if not modules :
+			return []
+		
+		# list() copies are atomic, so concurrent decoration never breaks the iteration
+		if module is None :
+			return [fn for fns in list( modules.values()) for fn in _alive( fns)]
+		
+		if not isinstance( module, str) :
+			module = module.__name__
+		
+		return _alive( modules.get( module, {}))
+	
+	@_registrymethod
+	def matrix( this, module = None) :
+		"""Returns the bit matrix of the decorated real functions by the registered decorators
+		
+		It's a snapshot for the bulk queries over many functions, like finding all the handlers
+		decorated with one decorator but not with another one or counting decorators per module,
+		see regd.matrix.DecoratorMatrix.
+		
+		:param module: optional module object or module name to build the matrix of
+		:rtype: DecoratorMatrix
+		"""
+		if module is not None and not isinstance( module, str) :
+			module = module.__name__
+		
+		rows, functions, modules, columns = {}, [], [], {}
+		
+		with this._read_lock :
+			generation = this.generation
+			decorators = list( this._decorator_bits)
+			
+			for decorator in decorators :
+				column = columns[decorator] = []
+				
+				for name, fns in this._functions_index.get( decorator, {}).items() :
+					if module is not None and name != module :
+						continue
+					
+					for fn in _alive( fns) :
+						row = rows.get( fn)
+						
+						if row is None :
+							row = rows[fn] = len( functions)
+							functions.append( fn)
+							modules.append( name)
+						
+						column.append( row)
+		
+		return DecoratorMatrix( functions, decorators, columns.get, modules, generation)
+	
+	@_registrymethod
+	def dumps( this) :
+		"""Returns the compact binary snapshot of the registry
+		
+		Snapshot keeps the module and qualified names of the decorated real functions, the names
+		of their decorators in the order they were applied and the arguments of the parametrized
+		ones. It's read with regd.snapshot.RegistrySnapshot by the processes which did not import
+		the decorated code, like process pool workers:
+		::
+			from regd.snapshot import RegistrySnapshot
+			
+			block = RegistrySnapshot.share( DecoratorRegistry.dumps())
+			
+			# in the worker, given block.name
+			snapshot = RegistrySnapshot.attach( name)
+			print( snapshot.functions_decorated_with( 'route'))
+		
+		:rtype: bytes
+		"""
+		with this._read_lock :
+			natives = dict.fromkeys( fn for decorator in list( this._decorator_bits)
+				for fn in this.functions_decorated_with( decorator))
+		
+		entries = []
+		
+		for native_fn in natives :
+			record = this._resolve( native_fn)[1]
+			
+			if record is None :
+				continue
+			
+			position = dict( ( decorator, i) for i, decorator in enumerate( record.decorators))
+			
+			entries.append( (
+				getattr( native_fn, '__module__', None),
+				getattr( native_fn, '__qualname__', getattr( native_fn, '__name__', '')),
+				[getattr( decorator, '__name__', '') for decorator in record.decorators],
+				[( position[layer.decorator], layer.args, layer.kw) for layer in record.layers
+					if layer.args is not None and layer.decorator in position],
+			))
+		
+		# binary format is needed only by the processes exporting the registry
+		from regd.snapshot import dumps
+		return dumps( entries)
+	
+	@_registrymethod
+	def export( this, path) :
+		"""Writes the binary snapshot of the registry to a file atomically, see dumps()
+		
+		The file is read with regd.snapshot.RegistrySnapshot.open() which maps it into memory.
+		
+		:param path: file path
+		:rtype: int - snapshot size in bytes
+		"""
+		data     = this.dumps()
+		tmp_path = '%s.%d.tmp' %( path, os.getpid())
+		
+		with open( tmp_path, 'wb') as f :
+			f.write( data)
+		
+		os.replace( tmp_path, path)
+		
+		return len( data)
 	
-	@classmethod
+	@_registrymethod
 	def decorated_methods( this, cls, decorator) :
 		"""Returns generator for all found methods decorated with given decorator in a given class
 		
@@ -350,9 +2200,17 @@ class DecoratorRegistry( object) :
 		:param decorator: decorator function to search
 		:rtype: generator of dict {methodname : method} contains found decorated class methods 
 		"""
-		# lookup for class in given cls parameter. All the class objects have type 'type'
-		while cls.__class__ is not type :
-			cls = cls.__class__
+		# lookup for class in given cls parameter
+		if not isinstance( cls, type) :
+			cls = type( cls)
+		
+		# classes derived from DecoratedClass have the prebuilt table including inherited methods
+		table = this.decorated_methods_table( cls)
+		
+		if table is not None :
+			for methodname, method in table.get( decorator, ()) :
+				yield { methodname : method }
+			return
 		
 		# search for decorated methods
 		for methodname in cls.__dict__.keys() :
@@ -361,7 +2219,47 @@ class DecoratorRegistry( object) :
 				if decorator in this.get_decorators( method) :
 					yield { methodname : method }
 	
-	@classmethod
+	@_registrymethod
+	def decorated_methods_table( this, cls) :
+		"""Returns the table of decorated methods of a class derived from DecoratedClass
+		
+		The table is built once at class creation and maps every registered decorator used
+		by the class or by any of its bases to the tuple of ( methodname, method ) pairs, merged
+		along the MRO the same way attribute lookup does. Hot code may look up the table directly
+		instead of iterating over decorated_methods().
+		
+		:param cls: class or object to get the table for
+		:rtype: read-only dict { decorator : tuple of ( methodname, method ) } or None if the class
+		        is not derived from DecoratedClass or its table is built by another registry
+		"""
+		if not isinstance( cls, type) :
+			cls = type( cls)
+		
+		if cls.__dict__.get( this.METHODS_REGISTRY) is not this :
+			return None
+		
+		return cls.__dict__.get( this.METHODS_TABLE)
+	
+	@_registrymethod
+	def _build_methods_table( this, cls) :
+		""" Private method """
+		namespace = {}
+		
+		for base in reversed( cls.__mro__) :
+			namespace.update( base.__dict__)
+		
+		table = {}
+		
+		for methodname, method in namespace.items() :
+			if type( method) is types.FunctionType :
+				for decorator in this.get_decorators( method) :
+					table.setdefault( decorator, []).append( ( methodname, method))
+		
+		table = dict( ( decorator, tuple( methods)) for decorator, methods in table.items())
+		setattr( cls, this.METHODS_TABLE, types.MappingProxyType( table))
+		setattr( cls, this.METHODS_REGISTRY, this)
+	
+	@_registrymethod
 	def all_decorated_module_functions( this, module, exclude_methods = False, exclude_functions = False) :
 		"""Returns generator of functions decorated with any registered decorator
 		in a given module.
@@ -397,7 +2295,12 @@ class DecoratorRegistry( object) :
 		:param exclude_functions: bool flag to turn on/off function inclusion into result
 		:rtype: generator of dict { function_name : function }
 		"""
-		module_names = []
+		if this._track_modules :
+			for mfn in this._indexed_module_functions( module, None, exclude_methods, exclude_functions) :
+				yield mfn
+			return
+		
+		module_names = set()
 		for el in dir( module) :
 			fn = module.__dict__.get( el)
 
@@ -405,10 +2308,10 @@ class DecoratorRegistry( object) :
 			if not exclude_functions and type( fn) in [types.FunctionType, staticmethod, classmethod] :
 				fn = this._getfn( fn)
 				if len( this.get_decorators( fn)) > 0 :
-					fname = fn.__annotations__[this.NATIVE_FUNCTION].__name__
+					fname = this._get_native_function( fn).__name__
 					if fname not in module_names :
 						yield { fname : module.__dict__.get( fname) }
-						module_names += [fname]
+						module_names.add( fname)
 			
 			# lookup for class methods
 			if not exclude_methods and type( fn) is type :
@@ -417,12 +2320,12 @@ class DecoratorRegistry( object) :
 					if type( method) in [types.FunctionType, staticmethod, classmethod] :
 						method = this._getfn( method)
 						if len( this.get_decorators( method)) > 0:
-							fname = method.__annotations__[this.NATIVE_FUNCTION].__name__
+							fname = this._get_native_function( method).__name__
 							if fname not in module_names :
 								yield { "%s.%s" %(fn.__name__, fname) : fn.__dict__.get( fname) }
-								module_names += [fname]
+								module_names.add( fname)
 	
-	@classmethod
+	@_registrymethod
 	def module_functions_decorated_with( this, module, decorator, exclude_methods = False, exclude_functions = False) :
 		"""Returns generator of functions decorated with a given registered decorator
 		in a given module.
@@ -462,11 +2365,58 @@ class DecoratorRegistry( object) :
 		:param exclude_functions: bool flag to turn on/off function inclusion into result
 		:rtype: generator of dict { function_name : function }
 		"""
+		if this._track_modules :
+			for mfn in this._indexed_module_functions( module, decorator, exclude_methods, exclude_functions) :
+				yield mfn
+			return
+		
 		for mfn in this.all_decorated_module_functions( module, exclude_methods, exclude_functions) :
 			for fname, fn in mfn.items() :
 				if decorator in this.get_decorators( fn) :
 					yield { fname : fn }
 
+DecoratorRegistry.default = DecoratorRegistry()
+
+class DecoratedClass( object) :
+	"""
+	Mixin building the table of decorated methods at class creation.
+	
+	Every class derived from DecoratedClass gets the table of its methods decorated with
+	registered decorators, including the inherited ones, computed once when the class
+	is created. DecoratorRegistry.decorated_methods() then becomes a simple lookup:
+	::
+		from regd import DecoratorRegistry, DecoratedClass
+		
+		class Plugin( DecoratedClass) :
+			@my_decorator
+			def on_load( self) :
+				pass
+		
+		class MyPlugin( Plugin) :
+			@my_decorator
+			def on_unload( self) :
+				pass
+		
+		# both on_load and on_unload are found
+		print( list( DecoratorRegistry.decorated_methods( MyPlugin(), my_decorator)))
+	
+	The table is built by the default registry. Classes using the decorators of another registry
+	should pass it as the class keyword, it's inherited by the subclasses:
+	::
+		class Plugin( DecoratedClass, registry = plugins) :
+			pass
+	
+	Methods attached to the class after it was created are not in the table.
+	"""
+	
+	def __init_subclass__( cls, registry = None, **kwargs) :
+		super( DecoratedClass, cls).__init_subclass__( **kwargs)
+		
+		if registry is None :
+			registry = getattr( cls, DecoratorRegistry.METHODS_REGISTRY, DecoratorRegistry.default)
+		
+		registry._build_methods_table( cls)
+
 if __name__ == "__main__" :
 	"""	Performing unit tests for the DecoratorRegistry functionality """
 	import unittest
@@ -0,0 +1,444 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+Scanners of decorators usage: the static one which works on the source code and
+does not import anything and the parallel package scanner which imports the modules
+"""
+import ast
+import concurrent.futures
+import hashlib
+import importlib
+import importlib.util
+import marshal
+import os
+import pkgutil
+import traceback
+from regd.registry import DecoratorRegistry
+
+class _DecoratedFunctionsVisitor( ast.NodeVisitor) :
+	""" Private class collecting decorated functions of a module AST """
+
+	def __init__( self, scanner) :
+		self.scanner = scanner
+		self.path    = []
+		self.entries = []
+
+	def visit_ClassDef( self, node) :
+		self.path.append( node.name)
+		self.generic_visit( node)
+		self.path.pop()
+
+	def visit_FunctionDef( self, node) :
+		decorators = []
+
+		# decorators are applied bottom up, keep the order the registry uses
+		for expr in reversed( node.decorator_list) :
+			decorator = self.scanner._decorator_entry( expr)
+			if decorator is not None :
+				decorators.append( decorator)
+
+		if decorators :
+			qualname = '.'.join( self.path + [node.name])
+			self.entries.append( ( qualname, node.lineno, tuple( decorators)))
+
+		self.path += [node.name, '<locals>']
+		self.generic_visit( node)
+		del self.path[-2:]
+
+	visit_AsyncFunctionDef = visit_FunctionDef
+
+class StaticScanner( object) :
+	"""
+	Static scanner of registered decorators usage.
+
+	DecoratorRegistry is only able to see the functions of imported modules. StaticScanner
+	walks the source of a package with the ast module instead, so it's possible to find out
+	which functions use the given decorators without importing anything and to import only
+	the modules which are actually needed afterwards.
+
+	Decorators are matched by name. A name without dots also matches the last part of dotted
+	decorators, so "route" matches both @route and @app.route. Parametrized decorator calls
+	like @route( '/users', methods = ('GET',)) are matched as well and their literal arguments
+	are recorded, the arguments which are not literals are recorded as Ellipsis.
+
+	Results are cached per file in a compact marshal file when the cache path is given. The file
+	is parsed again only when its modification time or size changed and its content hash
+	differs from the cached one.
+
+	Usage example:
+	::
+		from regd.scanner import StaticScanner
+
+		scanner = StaticScanner( ['route', 'task'], cache = '.regd-manifest')
+		manifest = scanner.scan( 'myapp')
+
+		for module, qualname, args, kwargs in scanner.functions_decorated_with( manifest, 'route') :
+			print( "%s.%s is routed to %s" %(module, qualname, args[0]))
+
+		# import only the module of the handler which is actually needed
+		handler = scanner.load( 'myapp.views', 'UserView.get')
+
+	Manifest is a dict { module name : tuple of ( qualname, lineno, decorators ) } where decorators
+	is a tuple of ( decorator name, args tuple, kwargs dict ) in the order they are applied.
+
+	Files which can not be parsed do not stop the scan, they are skipped and reported in the
+	errors attribute - dict { file path : error message }. The errors are cached as well, so the
+	broken file is not parsed again until it's changed.
+	"""
+
+	CACHE_VERSION = 2
+	NON_LITERAL   = Ellipsis
+
+	def __init__( self, decorators, cache = None) :
+		"""
+		:param decorators: names of the decorators to look for, registered decorator functions
+		                   are accepted as well and matched by their names
+		:param cache: optional path of the manifest cache file
+		"""
+		self.names      = tuple( sorted( set(
+			name if isinstance( name, str) else name.__name__ for name in decorators)))
+		self.cache_path = cache
+		self._names     = frozenset( self.names)
+		self._cache     = None
+		self._dirty     = False
+		self.errors     = {}
+
+	def _decorator_name( self, expr) :
+		""" Private method """
+		parts = []
+
+		while isinstance( expr, ast.Attribute) :
+			parts.append( expr.attr)
+			expr = expr.value
+
+		if not isinstance( expr, ast.Name) :
+			return None
+
+		parts.append( expr.id)
+		name = '.'.join( reversed( parts))
+
+		if name in self._names or parts[0] in self._names :
+			return name
+
+		return None
+
+	def _literal( self, expr) :
+		""" Private method """
+		try :
+			return ast.literal_eval( expr)
+		except ( ValueError, TypeError, SyntaxError, MemoryError, RecursionError) :
+			return self.NON_LITERAL
+
+	def _decorator_entry( self, expr) :
+		""" Private method """
+		if not isinstance( expr, ast.Call) :
+			name = self._decorator_name( expr)
+			return None if name is None else ( name, (), {})
+
+		name = self._decorator_name( expr.func)
+
+		if name is None :
+			return None
+
+		args = tuple(
+			self.NON_LITERAL if isinstance( arg, ast.Starred) else self._literal( arg)
+			for arg in expr.args)
+		kwargs = dict(
+			( keyword.arg, self._literal( keyword.value))
+			for keyword in expr.keywords if keyword.arg is not None)
+
+		return ( name, args, kwargs)
+
+	def scan_source( self, source, filename = '<unknown>') :
+		"""Scans the given source code
+
+		:param source: module source code as str or bytes
+		:param filename: file name used for syntax error reporting
+		:rtype: tuple of ( qualname, lineno, decorators )
+		"""
+		visitor = _DecoratedFunctionsVisitor( self)
+		visitor.visit( ast.parse( source, filename))
+		return tuple( visitor.entries)
+
+	def _load_cache( self) :
+		""" Private method """
+		self._cache = {}
+
+		if self.cache_path is None or not os.path.exists( self.cache_path) :
+			return
+
+		try :
+			with open( self.cache_path, 'rb') as f :
+				version, names, files = marshal.load( f)
+		except ( OSError, EOFError, ValueError, TypeError) :
+			return
+
+		if version == self.CACHE_VERSION and tuple( names) == self.names :
+			self._cache = files
+
+	def save( self) :
+		"""Writes the manifest cache file if anything changed since it was loaded"""
+		if self.cache_path is None or not self._dirty :
+			return
+
+		tmp_path = '%s.%d.tmp' %(self.cache_path, os.getpid())
+
+		with open( tmp_path, 'wb') as f :
+			marshal.dump( ( self.CACHE_VERSION, self.names, self._cache), f)
+
+		os.replace( tmp_path, self.cache_path)
+		self._dirty = False
+
+	def scan_file( self, path) :
+		"""Scans the given source file using the cache when possible
+
+		:param path: path of the python source file
+		:rtype: tuple of ( qualname, lineno, decorators ), empty if the file can not be parsed
+		"""
+		if self._cache is None :
+			self._load_cache()
+
+		path   = os.path.abspath( path)
+		stat   = os.stat( path)
+		cached = self._cache.get( path)
+
+		if cached is None or cached[0] != stat.st_mtime_ns or cached[1] != stat.st_size :
+			with open( path, 'rb') as f :
+				source = f.read()
+
+			digest = hashlib.sha1( source).digest()
+
+			if cached is None or cached[2] != digest :
+				try :
+					entries, error = self.scan_source( source, path), None
+				except ( SyntaxError, ValueError) as e :
+					entries, error = (), '%s: %s' %( type( e).__name__, e)
+			else :
+				entries, error = cached[3], cached[4]
+
+			cached = self._cache[path] = ( stat.st_mtime_ns, stat.st_size, digest, entries, error)
+			self._dirty = True
+
+		if cached[4] is None :
+			self.errors.pop( path, None)
+		else :
+			self.errors[path] = cached[4]
+
+		return cached[3]
+
+	def _package_path( self, package) :
+		""" Private method """
+		if os.path.isdir( package) :
+			return os.path.abspath( package), os.path.basename( os.path.abspath( package))
+
+		spec = importlib.util.find_spec( package)
+
+		if spec is None or not spec.submodule_search_locations :
+			raise ImportError( "%s is not a package" %package)
+
+		return list( spec.submodule_search_locations)[0], package
+
+	def scan( self, package) :
+		"""Scans all the modules of a package and returns the manifest
+
+		:param package: package name or package directory
+		:rtype: dict { module name : tuple of ( qualname, lineno, decorators ) } of the modules
+		        using the decorators
+		"""
+		root, name = self._package_path( package)
+		manifest   = {}
+
+		for dirpath, dirnames, filenames in os.walk( root) :
+			dirnames[:] = sorted(
+				d for d in dirnames if os.path.isfile( os.path.join( dirpath, d, '__init__.py')))
+
+			relpath = os.path.relpath( dirpath, root)
+			prefix  = name if relpath == os.curdir else '%s.%s' %(name, relpath.replace( os.sep, '.'))
+
+			for filename in sorted( filenames) :
+				if not filename.endswith( '.py') :
+					continue
+
+				module  = prefix if filename == '__init__.py' else '%s.%s' %(prefix, filename[:-3])
+				entries = self.scan_file( os.path.join( dirpath, filename))
+
+				if entries :
+					manifest[module] = entries
+
+		self.save()
+
+		return manifest
+
+	def functions_decorated_with( self, manifest, decorator) :
+		"""Returns the functions of a manifest using the given decorator
+
+		:param manifest: manifest returned by scan()
+		:param decorator: decorator name or registered decorator function
+		:rtype: list of ( module name, qualname, args, kwargs ) for every decorator usage
+		"""
+		if not isinstance( decorator, str) :
+			decorator = decorator.__name__
+
+		found = []
+
+		for module, entries in manifest.items() :
+			for qualname, lineno, decorators in entries :
+				for name, args, kwargs in decorators :
+					if name == decorator or name.rsplit( '.', 1)[-1] == decorator :
+						found.append( ( module, qualname, args, kwargs))
+
+		return found
+
+	def load( self, module, qualname) :
+		"""Imports the module and returns the object with the given qualified name
+
+		:param module: module name
+		:param qualname: qualified name of a function in the module
+		:rtype: the module attribute as it is after decoration
+		"""
+		fn = importlib.import_module( module)
+
+		for name in qualname.split( '.') :
+			fn = getattr( fn, name)
+
+		return fn
+
+class ScanReport( object) :
+	"""
+	Result of scan_package(). It contains only strings and tuples, so it's picklable and
+	reports of several scans can be merged together.
+
+	:ivar functions: dict { qualified name : tuple of decorator names } of decorated functions
+	                 where qualified name is "module.qualname" of the real function
+	:ivar modules: list of the scanned module names
+	:ivar errors: dict { module name : formatted traceback } of modules failed to import or scan
+	:ivar timeouts: list of module names which were not scanned in time
+	"""
+
+	def __init__( self) :
+		self.functions = {}
+		self.modules   = []
+		self.errors    = {}
+		self.timeouts  = []
+
+	def merge( self, report) :
+		"""Merges another report into this one
+
+		:param report: ScanReport to merge
+		:rtype: ScanReport - this report
+		"""
+		self.functions.update( report.functions)
+		self.modules  += report.modules
+		self.errors.update( report.errors)
+		self.timeouts += report.timeouts
+		return self
+
+def _scan_module( name) :
+	""" Private function importing and scanning a single module, it's run by the pool workers """
+	report = ScanReport()
+	report.modules.append( name)
+
+	try :
+		module = importlib.import_module( name)
+
+		for mfn in DecoratorRegistry.all_decorated_module_functions( module) :
+			for fn in mfn.values() :
+				native_fn = DecoratorRegistry.get_real_function( fn)
+				qualname  = '%s.%s' %( getattr( native_fn, '__module__', name),
+					getattr( native_fn, '__qualname__', native_fn.__name__))
+				report.functions[qualname] = tuple(
+					decorator.__name__ for decorator in DecoratorRegistry.get_decorators( native_fn))
+	except BaseException :
+		report.errors[name] = traceback.format_exc()
+
+	return report
+
+def scan_package( package, workers = None, mode = 'thread', timeout = None) :
+	"""Imports all the submodules of a package concurrently and reports their decorated functions
+
+	Every module is imported and scanned with DecoratorRegistry.all_decorated_module_functions()
+	as a separate task of a thread or process pool, so a module which fails to import or takes
+	too long only affects its own entry of the report.
+
+	Usage example:
+	::
+		from regd.scanner import scan_package
+
+		report = scan_package( 'myapp', workers = 8, mode = 'process', timeout = 30)
+
+		for qualname, decorators in sorted( report.functions.items()) :
+			print( "%s: %s" %(qualname, ', '.join( decorators)))
+
+		for module, error in report.errors.items() :
+			print( "%s failed:\n%s" %(module, error))
+
+	:param package: package name or package module
+	:param workers: number of pool workers, by default it's chosen by concurrent.futures
+	:param mode: 'thread' or 'process' pool
+	:param timeout: seconds to wait for the whole scan, the modules which are not scanned by then
+	                are reported as timed out, None to wait forever
+	:rtype: ScanReport
+	"""
+	if mode == 'thread' :
+		executor = concurrent.futures.ThreadPoolExecutor( workers)
+	elif mode == 'process' :
+		executor = concurrent.futures.ProcessPoolExecutor( workers)
+	else :
+		raise ValueError( "mode should be 'thread' or 'process', not %r" %( mode,))
+
+	if isinstance( package, str) :
+		package = importlib.import_module( package)
+
+	report = ScanReport()
+
+	def onerror( name) :
+		report.errors[name] = traceback.format_exc()
+
+	names = [package.__name__]
+	names += [name for _, name, _ in pkgutil.walk_packages(
+		getattr( package, '__path__', []), package.__name__ + '.', onerror)]
+
+	futures = []
+
+	try :
+		futures = [( name, executor.submit( _scan_module, name)) for name in names]
+		done, _ = concurrent.futures.wait( [future for _, future in futures], timeout)
+
+		for name, future in futures :
+			if future not in done :
+				future.cancel()
+				report.modules.append( name)
+				report.timeouts.append( name)
+				continue
+
+			try :
+				report.merge( future.result())
+			except BaseException :
+				report.modules.append( name)
+				report.errors[name] = traceback.format_exc()
+	finally :
+		# shutdown( cancel_futures = True) needs python 3.9
+		for _, future in futures :
+			future.cancel()
+		executor.shutdown( wait = not report.timeouts)
+
+	return report
@@ -0,0 +1,370 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+Compact binary snapshot of the registry for the processes which did not import the code
+"""
+import importlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+
+MAGIC   = b'REGD'
+VERSION = 1
+
+# magic, version, flags, counts of strings, decorators and functions, offsets of strings,
+# decorators, functions, stacks, postings and arguments sections
+_HEADER    = struct.Struct( '<4sHHIIIIIIIII')
+# name string, first posting, postings count
+_DECORATOR = struct.Struct( '<III')
+# module string, qualname string, first stack item, stack length, arguments offset + 1 or 0
+_FUNCTION  = struct.Struct( '<IIIII')
+_UINT      = struct.Struct( '<I')
+
+def _marshalable( value) :
+	""" Private function, replaces the values marshal does not support with Ellipsis """
+	try :
+		marshal.dumps( value)
+		return value
+	except ValueError :
+		pass
+
+	if isinstance( value, ( tuple, list)) :
+		return type( value)( _marshalable( item) for item in value)
+
+	if isinstance( value, dict) :
+		return dict( ( key, _marshalable( item)) for key, item in value.items() if isinstance( key, str))
+
+	return Ellipsis
+
+def dumps( entries) :
+	"""Packs the registry entries into the binary snapshot
+
+	DecoratorRegistry.dumps() is the usual way to get a snapshot, this function does the packing.
+
+	:param entries: sequence of ( module, qualname, decorator names, arguments ) where arguments is
+	                a list of ( decorator index in the names, args, kwargs ) of parametrized layers
+	:rtype: bytes
+	"""
+	strings, string_ids = [], {}
+
+	def string( value) :
+		value = value or ''
+		sid = string_ids.get( value)
+		if sid is None :
+			sid = string_ids[value] = len( strings)
+			strings.append( value.encode( 'utf-8', 'surrogatepass'))
+		return sid
+
+	decorator_ids, postings_of = {}, []
+	functions, stacks, arguments = [], [], bytearray()
+
+	for i, ( module, qualname, decorators, layers_args) in enumerate( entries) :
+		stack = []
+
+		for name in decorators :
+			did = decorator_ids.get( name)
+			if did is None :
+				did = decorator_ids[name] = len( postings_of)
+				postings_of.append( [])
+			postings_of[did].append( i)
+			stack.append( did)
+
+		args_offset = 0
+
+		if layers_args :
+			blob = marshal.dumps( [( decorator_ids[decorators[position]], _marshalable( args), _marshalable( kw))
+				for position, args, kw in layers_args])
+			args_offset = len( arguments) + 1
+			arguments  += _UINT.pack( len( blob)) + blob
+
+		functions.append( _FUNCTION.pack( string( module), string( qualname), len( stacks), len( stack), args_offset))
+		stacks += stack
+
+	decorators, postings = [], []
+
+	for name, did in sorted( decorator_ids.items(), key = lambda item : item[1]) :
+		decorators.append( _DECORATOR.pack( string( name), len( postings), len( postings_of[did])))
+		postings += postings_of[did]
+
+	offsets, position = [], 0
+	for value in strings :
+		offsets.append( position)
+		position += len( value)
+	offsets.append( position)
+
+	sections = [
+		struct.pack( '<%dI' %len( offsets), *offsets) + b''.join( strings),
+		b''.join( decorators),
+		b''.join( functions),
+		struct.pack( '<%dI' %len( stacks), *stacks),
+		struct.pack( '<%dI' %len( postings), *postings),
+		bytes( arguments),
+	]
+
+	starts, position = [], _HEADER.size
+	for section in sections :
+		# sections are aligned to 4 bytes
+		position += -position % 4
+		starts.append( position)
+		position += len( section)
+
+	data = bytearray( position)
+	data[:_HEADER.size] = _HEADER.pack( MAGIC, VERSION, 0, len( strings), len( decorators), len( functions), *starts)
+
+	for start, section in zip( starts, sections) :
+		data[start:start + len( section)] = section
+
+	return bytes( data)
+
+class RegistrySnapshot( object) :
+	"""
+	Read-only view of the binary registry snapshot made with DecoratorRegistry.dumps().
+
+	Workers of a process pool and job runners answer the registry queries with it without
+	importing the modules of the parent process. The snapshot is read in place from an mmap-ed
+	file or from a shared memory block, only the parts a query needs are decoded. Functions
+	are identified by ( module, qualname ) and decorators by their names, the function itself
+	is imported only when load() is called:
+	::
+		# parent process
+		DecoratorRegistry.export( '/run/myapp/registry.bin')
+
+		# worker process
+		snapshot = RegistrySnapshot.open( '/run/myapp/registry.bin')
+
+		for module, qualname in snapshot.functions_decorated_with( 'route') :
+			print( module, qualname, snapshot.get_decorator_arguments( module, qualname, 'route'))
+
+		handler = snapshot.load( 'myapp.views', 'users')
+
+	Arguments of parametrized decorators are kept as far as marshal supports them, other values
+	are replaced with Ellipsis.
+	"""
+
+	def __init__( self, buffer, close = None) :
+		"""
+		:param buffer: bytes-like object with the snapshot
+		:param close: optional function releasing the buffer, called by close()
+		"""
+		self._buffer = memoryview( buffer)
+		self._close  = close
+		self._index  = None
+
+		header = _HEADER.unpack_from( self._buffer, 0)
+
+		if header[0] != MAGIC or header[1] != VERSION :
+			raise ValueError( "not a registry snapshot of version %d" %VERSION)
+
+		( _, _, _, self._strings_count, self._decorators_count, self._functions_count,
+			self._strings, self._decorators, self._functions, self._stacks, self._postings,
+			self._arguments) = header
+
+	@classmethod
+	def open( cls, path) :
+		"""Maps the snapshot file into memory
+
+		:param path: snapshot file path
+		:rtype: RegistrySnapshot
+		"""
+		with open( path, 'rb') as f :
+			mapped = mmap.mmap( f.fileno(), 0, access = mmap.ACCESS_READ)
+
+		return cls( mapped, mapped.close)
+
+	@classmethod
+	def attach( cls, name) :
+		"""Attaches to the snapshot in a shared memory block created with share()
+
+		:param name: shared memory block name
+		:rtype: RegistrySnapshot
+		"""
+		from multiprocessing import shared_memory
+
+		# the block is owned by the process which created it: it's registered with the resource
+		# tracker of the creator, which attached processes started by multiprocessing share, and
+		# is unlinked by the creator. Attached processes should not touch the tracker at all.
+		if sys.version_info >= ( 3, 13) :
+			block = shared_memory.SharedMemory( name, track = False)
+			return cls( block.buf, block.close)
+
+		if os.name == 'nt' :
+			# windows blocks are not tracked
+			block = shared_memory.SharedMemory( name)
+			return cls( block.buf, block.close)
+
+		# SharedMemory registers every attached block before python 3.13, so the block is
+		# mapped read-only the same way open() maps the file
+		import _posixshmem
+
+		fd = _posixshmem.shm_open( name if name.startswith( '/') else '/' + name, os.O_RDONLY, mode = 0o600)
+		try :
+			mapped = mmap.mmap( fd, os.fstat( fd).st_size, access = mmap.ACCESS_READ)
+		finally :
+			os.close( fd)
+
+		return cls( mapped, mapped.close)
+
+	@staticmethod
+	def share( data, name = None) :
+		"""Copies the snapshot into a new shared memory block
+
+		The caller owns the block and should close() and unlink() it once the workers are done.
+
+		:param data: snapshot bytes returned by DecoratorRegistry.dumps()
+		:param name: optional shared memory block name
+		:rtype: multiprocessing.shared_memory.SharedMemory
+		"""
+		from multiprocessing import shared_memory
+
+		block = shared_memory.SharedMemory( name, create = True, size = len( data))
+		block.buf[:len( data)] = data
+		return block
+
+	def close( self) :
+		"""Releases the snapshot buffer"""
+		self._buffer.release()
+
+		if self._close is not None :
+			self._close()
+			self._close = None
+
+	def __enter__( self) :
+		return self
+
+	def __exit__( self, *exc_info) :
+		self.close()
+		return False
+
+	def __len__( self) :
+		return self._functions_count
+
+	def _string( self, sid) :
+		""" Private method """
+		start, end = struct.unpack_from( '<2I', self._buffer, self._strings + 4 * sid)
+		base = self._strings + 4 * ( self._strings_count + 1)
+		return str( self._buffer[base + start:base + end], 'utf-8', 'surrogatepass')
+
+	def _function( self, i) :
+		""" Private method, returns ( module, qualname, stack start, stack length, arguments offset ) """
+		return _FUNCTION.unpack_from( self._buffer, self._functions + _FUNCTION.size * i)
+
+	def _decorator_name( self, did) :
+		""" Private method """
+		return self._string( _DECORATOR.unpack_from( self._buffer, self._decorators + _DECORATOR.size * did)[0])
+
+	def _find( self, module, qualname) :
+		""" Private method, returns the function number or None """
+		if self._index is None :
+			index = {}
+			for i in range( self._functions_count) :
+				entry = self._function( i)
+				index[( self._string( entry[0]), self._string( entry[1]))] = i
+			self._index = index
+
+		return self._index.get( ( module or '', qualname))
+
+	def decorators( self) :
+		"""Returns the names of the decorators in the snapshot
+
+		:rtype: list of str
+		"""
+		return [self._decorator_name( did) for did in range( self._decorators_count)]
+
+	def functions_decorated_with( self, decorator) :
+		"""Returns the functions decorated with the given decorator
+
+		:param decorator: decorator name or registered decorator function
+		:rtype: list of ( module, qualname ) in decoration order
+		"""
+		if not isinstance( decorator, str) :
+			decorator = decorator.__name__
+
+		found = {}
+
+		# several decorators may share the same name
+		for did in range( self._decorators_count) :
+			name, start, count = _DECORATOR.unpack_from( self._buffer, self._decorators + _DECORATOR.size * did)
+
+			if self._string( name) == decorator :
+				found.update( dict.fromkeys( struct.unpack_from( '<%dI' %count, self._buffer, self._postings + 4 * start)))
+
+		return [( self._string( entry[0]), self._string( entry[1])) for entry in map( self._function, found)]
+
+	def get_decorators( self, module, qualname) :
+		"""Returns the names of the decorators of a function
+
+		:param module: module name
+		:param qualname: qualified name of the function in the module
+		:rtype: tuple of decorator names in the order they were applied
+		"""
+		i = self._find( module, qualname)
+
+		if i is None :
+			return ()
+
+		_, _, start, length, _ = self._function( i)
+		return tuple( self._decorator_name( did)
+			for did in struct.unpack_from( '<%dI' %length, self._buffer, self._stacks + 4 * start))
+
+	def get_decorator_arguments( self, module, qualname, decorator) :
+		"""Returns the arguments the given parametrized decorator was applied to a function with
+
+		:param module: module name
+		:param qualname: qualified name of the function in the module
+		:param decorator: decorator name or registered decorator function
+		:rtype: list of ( args tuple, kwargs dict ) for every application of the decorator
+		"""
+		if not isinstance( decorator, str) :
+			decorator = decorator.__name__
+
+		i = self._find( module, qualname)
+
+		if i is None :
+			return []
+
+		offset = self._function( i)[4]
+
+		if not offset :
+			return []
+
+		start  = self._arguments + offset - 1
+		length = _UINT.unpack_from( self._buffer, start)[0]
+		layers = marshal.loads( self._buffer[start + 4:start + 4 + length])
+
+		return [( args, kw) for did, args, kw in layers if self._decorator_name( did) == decorator]
+
+	def load( self, module, qualname) :
+		"""Imports the module and returns the object with the given qualified name
+
+		:param module: module name
+		:param qualname: qualified name of a function in the module
+		:rtype: the module attribute as it is after decoration
+		"""
+		fn = importlib.import_module( module)
+
+		for name in qualname.split( '.') :
+			fn = getattr( fn, name)
+
+		return fn
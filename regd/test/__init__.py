@@ -1,3 +1,6 @@
 from .testregistry import *
+from .testscanner import *
+from .testmetrics import *
+from .testsnapshot import *
 
 __author__ = ("Mykhailo Stadnyk <mikhus@gmail.com>")
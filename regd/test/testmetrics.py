@@ -0,0 +1,129 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+Unit tests for call metrics module
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from regd.registry import DecoratorRegistry
+from regd.metrics import CallMetrics
+from regd.test.testregistry import just_decorator
+
+class TestCallMetrics( unittest.TestCase) :
+
+	def setUp( self) :
+		self.registry = DecoratorRegistry()
+		self.metrics  = CallMetrics( sample_every = 2, buckets = ( 1.0,))
+
+	def test1_snapshot( self) :
+		traced = self.registry.decorator( just_decorator, metrics = self.metrics)
+
+		@traced
+		def handler( fail = False) :
+			if fail :
+				raise KeyError( 'fail')
+			return 'ok'
+
+		native = self.registry.get_real_function( handler)
+		key    = ( '%s.%s' %( native.__module__, native.__qualname__), 'just_decorator')
+		self.assertTrue( self.registry.is_decorated_with( handler, traced))
+		self.assertEqual( native.__name__, 'handler')
+
+		threads = [threading.Thread( target = lambda : [handler() for _ in range( 10)]) for _ in range( 3)]
+		for thread in threads :
+			thread.start()
+		for thread in threads :
+			thread.join()
+
+		self.assertRaises( KeyError, handler, True)
+
+		stats = self.metrics.snapshot()[key]
+		self.assertEqual( ( stats['calls'], stats['errors'], stats['sampled']), ( 31, 1, 15))
+		self.assertEqual( stats['buckets'][-1], ( float( 'inf'), 15))
+
+		# buffers of the finished threads are folded into the totals
+		self.assertEqual( len( self.metrics._buffers), 1)
+
+		self.metrics.reset()
+		self.assertEqual( self.metrics.snapshot(), {})
+		handler()
+		self.assertEqual( self.metrics.snapshot()[key]['calls'], 1)
+
+	def test2_prometheus( self) :
+		route = self.registry.parametrized_decorator( lambda path : just_decorator, metrics = self.metrics)
+
+		@route( '/users')
+		def users() : pass
+
+		native = self.registry.get_real_function( users)
+		for _ in range( 4) :
+			users()
+
+		path = tempfile.mkdtemp()
+		try :
+			filename = os.path.join( path, 'regd.prom')
+			self.metrics.write_prometheus( filename)
+			with open( filename) as f :
+				text = f.read()
+		finally :
+			shutil.rmtree( path)
+
+		self.assertTrue( '# TYPE regd_calls_total counter' in text)
+		self.assertTrue( 'regd_calls_total{function="%s.%s",decorator="<lambda>"} 4' %( native.__module__, native.__qualname__) in text)
+		self.assertTrue( 'le="+Inf"} 2' in text)
+		self.assertTrue( 'regd_call_duration_seconds_count{' in text)
+
+	def test3_same_names( self) :
+		first  = self.registry.decorator( lambda fn : fn, metrics = self.metrics)
+		second = self.registry.decorator( lambda fn : fn, metrics = self.metrics)
+		route  = self.registry.parametrized_decorator( lambda path : just_decorator, metrics = self.metrics)
+
+		def handler_of( path) :
+			@route( path)
+			def handler() : pass
+			return handler
+
+		@first
+		@second
+		def both() : pass
+
+		handlers = [handler_of( '/a'), handler_of( '/b')]
+		both()
+		handlers[0]()
+		handlers[1]()
+		handlers[1]()
+
+		function = '%s.%s' %( __name__, both.__qualname__)
+		handler  = '%s.%s' %( __name__, self.registry.get_real_function( handlers[0]).__qualname__)
+		calls    = dict( ( key, stats['calls']) for key, stats in self.metrics.snapshot().items())
+		self.assertEqual( calls, {
+			( function, '<lambda>')   : 1,
+			( function, '<lambda>#2') : 1,
+			( handler, '<lambda>')    : 1,
+			( handler + '#2', '<lambda>') : 2,
+		})
+
+		# labels are kept when the function is decorated again
+		self.assertEqual( self.metrics._key( self.registry.get_real_function( both), first), ( function, '<lambda>#2'))
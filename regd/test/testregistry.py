@@ -72,11 +72,10 @@ class TestDecoratorRegistry( unittest.TestCase) :
 		regres = somefunc2( 7, 7, 7)
 
 		self.assertEqual( noregres, regres)
-		self.assertTrue( DecoratorRegistry.DECORATOR in somefunc2.__annotations__)
-		self.assertTrue( DecoratorRegistry.NATIVE_FUNCTION in somefunc2.__annotations__)
-		self.assertEqual( somefunc2.__annotations__[DecoratorRegistry.NATIVE_FUNCTION].__name__, 'somefunc2')
-		self.assertTrue( DecoratorRegistry.DECORATORS in somefunc2.__annotations__[DecoratorRegistry.NATIVE_FUNCTION].__annotations__)
-		self.assertTrue( rjd in somefunc2.__annotations__[DecoratorRegistry.NATIVE_FUNCTION].__annotations__[DecoratorRegistry.DECORATORS])
+		self.assertEqual( somefunc2.__annotations__, {})
+		self.assertTrue( DecoratorRegistry._get_decorator( somefunc2) is not None)
+		self.assertEqual( DecoratorRegistry._get_native_function( somefunc2).__name__, 'somefunc2')
+		self.assertTrue( rjd in DecoratorRegistry.get_decorators( somefunc2))
 
 	def test3_parametrized_decorator( self) :
 		@decorator_with_args(1, 2, 3)
@@ -89,11 +88,10 @@ class TestDecoratorRegistry( unittest.TestCase) :
 		regres = somefunc2( 7, 7, 7)
 
 		self.assertEqual( noregres, regres)
-		self.assertTrue( DecoratorRegistry.DECORATOR in somefunc2.__annotations__)
-		self.assertTrue( DecoratorRegistry.NATIVE_FUNCTION in somefunc2.__annotations__)
-		self.assertEqual( somefunc2.__annotations__[DecoratorRegistry.NATIVE_FUNCTION].__name__, 'somefunc2')
-		self.assertTrue( DecoratorRegistry.DECORATORS in somefunc2.__annotations__[DecoratorRegistry.NATIVE_FUNCTION].__annotations__)
-		self.assertTrue( rdwa in somefunc2.__annotations__[DecoratorRegistry.NATIVE_FUNCTION].__annotations__[DecoratorRegistry.DECORATORS])
+		self.assertEqual( somefunc2.__annotations__, {})
+		self.assertTrue( DecoratorRegistry._get_decorator( somefunc2) is not None)
+		self.assertEqual( DecoratorRegistry._get_native_function( somefunc2).__name__, 'somefunc2')
+		self.assertTrue( rdwa in DecoratorRegistry.get_decorators( somefunc2))
 
 	def test4_is_decorated_with( self) :
 		@decorator_with_args(1, 2, 3)
@@ -147,3 +145,799 @@ class TestDecoratorRegistry( unittest.TestCase) :
 		funcs = list( DecoratorRegistry.module_functions_decorated_with( testmodule, testmodule.deco2))
 		self.assertEqual( len( funcs), 2)
 		
+
+	def test9_functions_decorated_with( self) :
+		from . import testmodule
+		
+		funcs = DecoratorRegistry.functions_decorated_with( testmodule.deco2)
+		self.assertEqual( len( funcs), 2)
+		self.assertTrue( DecoratorRegistry.get_real_function( testmodule.non_class_member) in funcs)
+		self.assertTrue( DecoratorRegistry.get_real_function( testmodule.Test.class_member) in funcs)
+		
+		self.assertEqual( len( DecoratorRegistry.functions_decorated_with( testmodule.deco, testmodule)), 3)
+		self.assertEqual( len( DecoratorRegistry.functions_decorated_with( testmodule.deco, 'no.such.module')), 0)
+		self.assertEqual( DecoratorRegistry.functions_decorated_with( just_decorator), [])
+
+	def test10_annotations_mode( self) :
+		rjd = DecoratorRegistry.decorator( just_decorator)
+		
+		@rjd
+		def hinted( a: int) -> int : return a
+		
+		self.assertEqual( hinted.__annotations__, {})
+		self.assertEqual( DecoratorRegistry.get_real_function( hinted).__annotations__, { 'a' : int, 'return' : int })
+		
+		DecoratorRegistry.use_annotations( True)
+		try :
+			@rjd
+			def somefunc( *args) : return args
+		finally :
+			DecoratorRegistry.use_annotations( False)
+		
+		native_fn = somefunc.__annotations__[DecoratorRegistry.NATIVE_FUNCTION]
+		self.assertEqual( native_fn.__name__, 'somefunc')
+		self.assertTrue( somefunc.__annotations__[DecoratorRegistry.DECORATOR] is not None)
+		self.assertEqual( native_fn.__annotations__[DecoratorRegistry.DECORATORS], [rjd])
+	
+	def test11_records_are_released( self) :
+		import gc
+		rjd = DecoratorRegistry.decorator( just_decorator)
+		
+		@rjd
+		def somefunc() : pass
+		
+		key = id( somefunc)
+		self.assertTrue( key in DecoratorRegistry.default._records)
+		del somefunc
+		gc.collect()
+		self.assertFalse( key in DecoratorRegistry.default._records)
+	
+	def test12_is_decorated_with_all_any( self) :
+		public   = DecoratorRegistry.decorator( just_decorator)
+		internal = DecoratorRegistry.decorator( just_decorator)
+		auth     = DecoratorRegistry.parametrized_decorator( decorator_with_args)
+		
+		@auth( 'user')
+		@public
+		def handler() : pass
+		
+		self.assertTrue( DecoratorRegistry.is_decorated_with_all( handler, public, auth))
+		self.assertFalse( DecoratorRegistry.is_decorated_with_all( handler, public, internal))
+		self.assertFalse( DecoratorRegistry.is_decorated_with_all( handler, public, free_decorator))
+		self.assertTrue( DecoratorRegistry.is_decorated_with_any( handler, internal, auth))
+		self.assertFalse( DecoratorRegistry.is_decorated_with_any( handler, internal, free_decorator))
+		self.assertFalse( DecoratorRegistry.is_decorated_with( handler, internal))
+		self.assertFalse( DecoratorRegistry.is_decorated_with_any( free_decorator, public))
+	
+	def test13_native_function_resolution( self) :
+		def a() : pass
+		def b() : pass
+		def c() : pass
+		def d() : pass
+		
+		DecoratorRegistry._set_native_function( a, b)
+		DecoratorRegistry._set_native_function( b, c)
+		self.assertTrue( DecoratorRegistry.get_real_function( a) is c)
+		self.assertTrue( DecoratorRegistry._get_record( a).native_function is c)
+		
+		# a layer applied later on top of the resolved root keeps the answers correct
+		DecoratorRegistry._set_native_function( c, d)
+		self.assertTrue( DecoratorRegistry.get_real_function( a) is d)
+		self.assertTrue( DecoratorRegistry.get_real_function( b) is d)
+		self.assertTrue( DecoratorRegistry._get_record( a).native_function is d)
+	
+	def test14_decorated_class( self) :
+		from regd import DecoratedClass
+		jd  = DecoratorRegistry.decorator( just_decorator)
+		dwa = DecoratorRegistry.parametrized_decorator( decorator_with_args)
+		
+		class Base( DecoratedClass) :
+			@jd
+			def inherited( self) : pass
+			
+			@jd
+			def overridden( self) : pass
+		
+		class Derived( Base) :
+			@dwa( 1)
+			def own( self) : pass
+			
+			def overridden( self) : pass
+		
+		names = [list( m.keys())[0] for m in DecoratorRegistry.decorated_methods( Derived(), jd)]
+		self.assertEqual( names, ['inherited'])
+		self.assertEqual( [name for name, _ in DecoratorRegistry.decorated_methods_table( Derived)[dwa]], ['own'])
+		self.assertFalse( dwa in DecoratorRegistry.decorated_methods_table( Base))
+		self.assertEqual( len( list( DecoratorRegistry.decorated_methods( Base, jd))), 2)
+		self.assertTrue( DecoratorRegistry.decorated_methods_table( object) is None)
+	
+	def test15_track_modules( self) :
+		import importlib, os, shutil, sys, tempfile
+		from . import testmodule
+		
+		DecoratorRegistry.track_modules( True)
+		path = tempfile.mkdtemp()
+		dont_write_bytecode, sys.dont_write_bytecode = sys.dont_write_bytecode, True
+		try :
+			self.assertEqual( len( list( DecoratorRegistry.all_decorated_module_functions( testmodule))), 3)
+			self.assertEqual( len( list( DecoratorRegistry.all_decorated_module_functions( testmodule, exclude_methods = True))), 1)
+			funcs = list( DecoratorRegistry.module_functions_decorated_with( testmodule, testmodule.deco2))
+			self.assertEqual( sorted( list( f.keys())[0] for f in funcs), ['Test.class_member', 'non_class_member'])
+			
+			source = "from regd.test.testmodule import deco\n@deco\ndef %s() : pass\n"
+			with open( os.path.join( path, 'regd_tracked.py'), 'w') as f :
+				f.write( source %'first')
+			sys.path.insert( 0, path)
+			module = importlib.import_module( 'regd_tracked')
+			self.assertEqual( [list( f.keys())[0] for f in DecoratorRegistry.all_decorated_module_functions( module)], ['first'])
+			
+			with open( os.path.join( path, 'regd_tracked.py'), 'w') as f :
+				f.write( source %'second_one')
+			importlib.reload( module)
+			self.assertEqual( [list( f.keys())[0] for f in DecoratorRegistry.all_decorated_module_functions( module)], ['second_one'])
+			self.assertEqual( [fn.__name__ for fn in DecoratorRegistry.functions_decorated_with( testmodule.deco, module)], ['second_one'])
+		finally :
+			DecoratorRegistry.track_modules( False)
+			sys.dont_write_bytecode = dont_write_bytecode
+			sys.path.remove( path)
+			sys.modules.pop( 'regd_tracked', None)
+			shutil.rmtree( path)
+	
+	def test16_interned_parametrized_decorator( self) :
+		calls = []
+		def counted( *dargs, **dkwargs) :
+			calls.append( dargs)
+			return decorator_with_args( *dargs, **dkwargs)
+		
+		dwa = DecoratorRegistry.parametrized_decorator( counted, cache_size = 2)
+		
+		self.assertTrue( dwa( 1, methods = ( 'GET',)) is dwa( 1, methods = ( 'GET',)))
+		self.assertFalse( dwa( 1) is dwa( True))
+		self.assertFalse( dwa( []) is dwa( []))
+		self.assertEqual( len( calls), 5)
+		self.assertEqual( dwa.cache_info(), ( 1, 3, 2, 2))
+		
+		@dwa( 1)
+		def first() : pass
+		@dwa( 1)
+		def second() : pass
+		
+		self.assertEqual( len( calls), 5)
+		self.assertTrue( DecoratorRegistry.is_decorated_with( first, dwa))
+		self.assertTrue( DecoratorRegistry.is_decorated_with( second, dwa))
+		self.assertTrue( dwa.cache_evict( 1))
+		self.assertFalse( dwa.cache_evict( 1))
+		dwa.cache_clear()
+		self.assertEqual( dwa.cache_info(), ( 0, 0, 2, 0))
+		
+		self.assertFalse( dwa( x = 1) is dwa( x = True))
+		self.assertFalse( dwa( ( 1,)) is dwa( ( True,)))
+		self.assertFalse( dwa( x = ( 1,)) is dwa( x = ( True,)))
+		self.assertTrue( dwa( x = ( 1, 'a')) is dwa( x = ( 1, 'a')))
+		
+		@dwa( x = True)
+		def third() : pass
+		
+		self.assertEqual( DecoratorRegistry.get_decorator_arguments( third, dwa), [( (), { 'x' : True})])
+		self.assertTrue( type( DecoratorRegistry.get_decorator_arguments( third, dwa)[0][1]['x']) is bool)
+	
+	def test17_decorator_arguments( self) :
+		def route( path, methods = ( 'GET',), **options) :
+			return decorator_with_args( path)
+		
+		route = DecoratorRegistry.parametrized_decorator( route, index = ( 'path',))
+		
+		@route( '/users')
+		def users() : pass
+		
+		@route( path = '/users', methods = ( 'POST',), auth = True)
+		@route( '/groups', ( 'POST',))
+		def create() : pass
+		
+		self.assertEqual( DecoratorRegistry.get_decorator_arguments( users, route), [( ( '/users',), {})])
+		self.assertEqual( len( DecoratorRegistry.get_decorator_arguments( create, route)), 2)
+		self.assertEqual( DecoratorRegistry.find( route, path = '/users'),
+			[DecoratorRegistry.get_real_function( users), DecoratorRegistry.get_real_function( create)])
+		self.assertEqual( DecoratorRegistry.find( route, path = '/groups'), [DecoratorRegistry.get_real_function( create)])
+		self.assertEqual( DecoratorRegistry.find( route, path = '/users', methods = ( 'GET',)), [DecoratorRegistry.get_real_function( users)])
+		self.assertEqual( DecoratorRegistry.find( route, path = '/groups', auth = True), [])
+		self.assertEqual( DecoratorRegistry.find( route, auth = True), [DecoratorRegistry.get_real_function( create)])
+		self.assertEqual( DecoratorRegistry.find( route, path = '/none'), [])
+	
+	def test18_concurrent_decoration( self) :
+		import threading
+		decorators = [DecoratorRegistry.decorator( just_decorator) for _ in range( 4)]
+		route = DecoratorRegistry.parametrized_decorator( decorator_with_args, cache_size = 4, index = ( 'dargs',))
+		functions = []
+		errors = []
+		start = threading.Barrier( 9)
+		
+		def decorate() :
+			start.wait()
+			for i in range( 200) :
+				def fn() : pass
+				for decorator in decorators :
+					fn = decorator( fn)
+				fn = route( i % 8)( fn)
+				functions.append( fn)
+		
+		def query() :
+			start.wait()
+			try :
+				for i in range( 200) :
+					DecoratorRegistry.functions_decorated_with( decorators[0])
+					DecoratorRegistry.find( route, dargs = ( i % 8,))
+			except Exception as e :
+				errors.append( e)
+		
+		threads = [threading.Thread( target = decorate) for _ in range( 6)]
+		threads += [threading.Thread( target = query) for _ in range( 3)]
+		for thread in threads :
+			thread.start()
+		for thread in threads :
+			thread.join()
+		
+		self.assertEqual( errors, [])
+		self.assertEqual( len( functions), 1200)
+		self.assertEqual( len( DecoratorRegistry.functions_decorated_with( decorators[0])), 1200)
+		self.assertEqual( len( DecoratorRegistry.find( route, dargs = ( 3,))), 150)
+		for fn in functions :
+			self.assertEqual( DecoratorRegistry.get_decorators( fn), tuple( decorators) + ( route,))
+	
+	def test19_registry_instances( self) :
+		from regd import DecoratedClass
+		web  = DecoratorRegistry( 'web')
+		jobs = DecoratorRegistry( 'jobs')
+		route = web.parametrized_decorator( decorator_with_args, index = ( 'dargs',))
+		task  = jobs.decorator( just_decorator)
+		
+		@route( '/users')
+		def users() : pass
+		
+		@task
+		def cleanup() : pass
+		
+		class Handlers( DecoratedClass, registry = web) :
+			@route( '/groups')
+			def groups( self) : pass
+		
+		class MoreHandlers( Handlers) :
+			pass
+		
+		self.assertTrue( web.is_decorated_with( users, route))
+		self.assertFalse( jobs.is_decorated_with( users, route))
+		self.assertFalse( DecoratorRegistry.is_decorated_with( users, route))
+		self.assertEqual( DecoratorRegistry.get_decorators( cleanup), ())
+		self.assertEqual( jobs.get_decorators( cleanup), ( task,))
+		self.assertEqual( len( web.functions_decorated_with( route)), 2)
+		self.assertEqual( jobs.functions_decorated_with( route), [])
+		self.assertEqual( web.find( route, dargs = ( '/users',)), [web.get_real_function( users)])
+		self.assertEqual( [name for name, _ in web.decorated_methods_table( MoreHandlers)[route]], ['groups'])
+		self.assertTrue( DecoratorRegistry.decorated_methods_table( MoreHandlers) is None)
+		self.assertEqual( repr( web), "<DecoratorRegistry 'web'>")
+	
+	def test20_subscribe( self) :
+		registry = DecoratorRegistry()
+		route = registry.parametrized_decorator( decorator_with_args)
+		jd    = registry.decorator( just_decorator)
+		
+		@route( '/early')
+		def early() : pass
+		
+		events = []
+		everything = []
+		def on_route( *event) : events.append( event)
+		def on_any( *event) : everything.append( event)
+		self.assertTrue( registry.subscribe( route, on_route, replay = True) is on_route)
+		registry.subscribe( None, on_any)
+		
+		@jd
+		@route( '/late', methods = ( 'GET',))
+		def late() : pass
+		
+		self.assertEqual( [( fn.__name__, args) for fn, wrapper, d, args in events],
+			[( 'early', ( ( '/early',), {})), ( 'late', ( ( '/late',), { 'methods' : ( 'GET',) }))])
+		self.assertTrue( events[0][1] is early)
+		self.assertTrue( events[1][2] is route)
+		self.assertEqual( [( d, args) for fn, wrapper, d, args in everything][1], ( jd, None))
+		self.assertTrue( everything[1][1] is late)
+		
+		replayed = []
+		registry.subscribe( None, lambda *event : replayed.append( event), replay = True)
+		self.assertEqual( len( replayed), 3)
+		
+		registry.unsubscribe( route, on_route)
+		@route( '/after')
+		def after() : pass
+		self.assertEqual( len( events), 2)
+		self.assertEqual( len( everything), 3)
+	
+	def test21_changes_since( self) :
+		registry = DecoratorRegistry( changelog_size = 3)
+		jd = registry.decorator( just_decorator)
+		self.assertEqual( registry.generation, 0)
+		self.assertEqual( registry.changes_since( 0), [])
+		
+		@jd
+		def first() : pass
+		
+		generation = registry.generation
+		
+		@jd
+		@jd
+		def second() : pass
+		
+		changes = registry.changes_since( generation)
+		self.assertEqual( len( changes), 1)
+		self.assertEqual( changes[0].action, DecoratorRegistry.ADDED)
+		self.assertTrue( changes[0].function is registry.get_real_function( second))
+		self.assertEqual( changes[0].qualname, registry.get_real_function( second).__qualname__)
+		self.assertEqual( changes[0].generation, registry.generation)
+		self.assertEqual( registry.changes_since( registry.generation), [])
+		
+		registry._forget_module( __name__)
+		changes = registry.changes_since( generation)
+		self.assertEqual( [c.action for c in changes], [DecoratorRegistry.ADDED, DecoratorRegistry.REMOVED, DecoratorRegistry.REMOVED])
+		self.assertEqual( registry.generation, 4)
+		self.assertTrue( registry.changes_since( 0) is None)
+		
+		# class attributes read the default registry
+		self.assertEqual( DecoratorRegistry.generation, DecoratorRegistry.default.generation)
+		self.assertFalse( DecoratorRegistry.frozen)
+	
+	def test22_disable_enable( self) :
+		import sys, types
+		registry = DecoratorRegistry()
+		calls = []
+		
+		def traced( fn) :
+			def wrapper( *args, **kwargs) :
+				calls.append( fn.__name__)
+				return fn( *args, **kwargs)
+			return wrapper
+		
+		trace = registry.decorator( traced)
+		outer = registry.decorator( just_decorator)
+		
+		module = types.ModuleType( 'regd_switched')
+		sys.modules[module.__name__] = module
+		try :
+			exec( '\n'.join( [
+				"@trace",
+				"def top() : return 'top'",
+				"@outer",
+				"@trace",
+				"def stacked() : return 'stacked'",
+				"class Service( object) :",
+				"	@staticmethod",
+				"	@trace",
+				"	def ping() : return 'pong'",
+			]), { 'trace' : trace, 'outer' : outer, '__name__' : module.__name__}, module.__dict__)
+			
+			self.assertEqual( ( module.top(), module.stacked(), module.Service.ping()), ( 'top', 'stacked', 'pong'))
+			self.assertEqual( len( calls), 3)
+			
+			self.assertEqual( registry.disable( trace), 3)
+			self.assertFalse( registry.is_enabled( trace))
+			self.assertEqual( ( module.top(), module.stacked(), module.Service.ping()), ( 'top', 'stacked', 'pong'))
+			self.assertEqual( len( calls), 3)
+			self.assertTrue( registry.is_decorated_with( module.top, trace))
+			
+			# functions decorated while disabled get the layer, disable() again switches it off
+			exec( "@trace\ndef late() : return 'late'", { 'trace' : trace, '__name__' : module.__name__}, module.__dict__)
+			self.assertFalse( module.late is registry.get_real_function( module.late))
+			self.assertEqual( module.late(), 'late')
+			self.assertEqual( len( calls), 4)
+			self.assertEqual( registry.disable( trace), 1)
+			self.assertEqual( module.late(), 'late')
+			self.assertEqual( len( calls), 4)
+			
+			self.assertEqual( registry.enable( trace), 4)
+			self.assertEqual( registry.enable( trace), 0)
+			self.assertEqual( ( module.top(), module.stacked(), module.Service.ping(), module.late()),
+				( 'top', 'stacked', 'pong', 'late'))
+			self.assertEqual( len( calls), 8)
+		finally :
+			del sys.modules[module.__name__]
+	
+	def test23_hook_decorator( self) :
+		import inspect
+		registry = DecoratorRegistry()
+		calls = []
+		
+		audit = registry.hook_decorator( before = lambda *args, **kwargs : calls.append( ( args, kwargs)), name = 'audit')
+		double = registry.hook_decorator( after = lambda result : result * 2)
+		
+		@double
+		@audit
+		def add( a, b = 10, *, scale = 1) :
+			return ( a + b) * scale
+		
+		self.assertEqual( add( 1), 22)
+		self.assertEqual( add( 1, 2, scale = 3), 18)
+		self.assertEqual( calls, [( ( 1, 10), { 'scale' : 1}), ( ( 1, 2), { 'scale' : 3})])
+		self.assertEqual( str( inspect.signature( add, follow_wrapped = False)), '(a, b=10, *, scale=1)')
+		self.assertEqual( registry.get_decorators( add), ( audit, double))
+		self.assertEqual( registry.get_real_function( add).__name__, 'add')
+		self.assertEqual( audit.__name__, 'audit')
+		
+		timed = registry.hook_decorator( around = lambda fn, *args, **kwargs : ( 'around', fn( *args, **kwargs)))
+		
+		@timed
+		def mul( a, b) : return a * b
+		
+		@timed
+		def neg( x) : return -x
+		
+		self.assertEqual( ( mul( 2, 3), neg( 1)), ( ( 'around', 6), ( 'around', -1)))
+		self.assertTrue( mul.__code__ is not neg.__code__)
+		self.assertRaises( ValueError, registry.hook_decorator)
+	
+	def test24_fused_hooks( self) :
+		import sys, types
+		registry = DecoratorRegistry()
+		calls = []
+		
+		first  = registry.hook_decorator( before = lambda *args : calls.append( 'first'), name = 'first')
+		second = registry.hook_decorator( before = lambda *args : calls.append( 'second'), after = lambda result : result + 1, name = 'second')
+		third  = registry.hook_decorator( around = lambda fn, *args : fn( *args) * 10, name = 'third')
+		
+		module = types.ModuleType( 'regd_fused')
+		sys.modules[module.__name__] = module
+		try :
+			exec( '\n'.join( [
+				"@first",
+				"@second",
+				"@third",
+				"def depth( x) :",
+				"	frame, n = sys._getframe(), 0",
+				"	while frame.f_code.co_name != 'test24_fused_hooks' :",
+				"		frame, n = frame.f_back, n + 1",
+				"	return n",
+			]), dict( module.__dict__, first = first, second = second, third = third, sys = sys), module.__dict__)
+			
+			# 3 frames: depth() itself, the around hook and the single fused wrapper, then
+			# multiplied by the around hook and incremented by the after hook
+			self.assertEqual( module.depth( 0), 31)
+			self.assertEqual( calls, ['first', 'second'])
+			self.assertEqual( registry.get_decorators( module.depth), ( third, second, first))
+			self.assertTrue( registry.is_decorated_with_all( module.depth, first, second, third))
+			self.assertEqual( registry.get_real_function( module.depth).__name__, 'depth')
+			
+			self.assertEqual( registry.disable( second), 1)
+			del calls[:]
+			self.assertEqual( module.depth( 0), 30)
+			self.assertEqual( calls, ['first'])
+			
+			registry.enable( second)
+			del calls[:]
+			self.assertEqual( module.depth( 0), 31)
+			self.assertEqual( calls, ['first', 'second'])
+			self.assertEqual( registry.get_decorators( module.depth), ( third, second, first))
+		finally :
+			del sys.modules[module.__name__]
+	
+	def test25_get_layer_bypass( self) :
+		registry = DecoratorRegistry()
+		calls = []
+		
+		def tagged( tag) :
+			def decorator( fn) :
+				def wrapper( *args, **kwargs) :
+					calls.append( tag)
+					return fn( *args, **kwargs)
+				return wrapper
+			decorator.__name__ = tag
+			return decorator
+		
+		auth, limit, log = [registry.decorator( tagged( tag)) for tag in ( 'auth', 'limit', 'log')]
+		first  = registry.hook_decorator( before = lambda x : calls.append( 'first'), name = 'first')
+		second = registry.hook_decorator( before = lambda x : calls.append( 'second'), name = 'second')
+		
+		@auth
+		@limit
+		@first
+		@second
+		@log
+		def handler( x) : return x
+		
+		handler( 1)
+		self.assertEqual( calls, ['auth', 'limit', 'first', 'second', 'log'])
+		
+		def calls_of( fn) :
+			del calls[:]
+			self.assertEqual( fn( 2), 2)
+			return calls
+		
+		self.assertEqual( calls_of( registry.get_layer( handler, limit)), ['limit', 'first', 'second', 'log'])
+		self.assertEqual( calls_of( registry.get_layer( handler, second)), ['second', 'log'])
+		self.assertTrue( registry.get_layer( handler, limit) is registry.get_layer( handler, limit))
+		self.assertTrue( registry.get_layer( handler, just_decorator) is None)
+		
+		self.assertEqual( calls_of( registry.bypass( handler, auth, limit)), ['first', 'second', 'log'])
+		self.assertEqual( calls_of( registry.bypass( handler, limit, auth, first)), ['second', 'log'])
+		self.assertEqual( calls_of( registry.bypass( handler, auth, limit, second)), ['first', 'log'])
+		self.assertEqual( calls_of( registry.bypass( handler, auth, limit, first, second, log)), [])
+		self.assertTrue( registry.bypass( handler) is handler)
+		self.assertTrue( registry.bypass( handler, auth) is registry.bypass( handler, auth))
+		self.assertRaises( ValueError, registry.bypass, handler, limit)
+		self.assertRaises( ValueError, registry.bypass, handler, auth, log)
+		
+		# layers of unregistered decorators are never skipped
+		free = tagged( 'free')
+		
+		@free
+		@auth
+		@log
+		def outer( x) : return x
+		
+		@auth
+		@free
+		@log
+		def inner( x) : return x
+		
+		self.assertRaises( ValueError, registry.bypass, outer, auth)
+		self.assertEqual( calls_of( registry.get_layer( outer, log)), ['log'])
+		self.assertEqual( calls_of( registry.get_layer( outer, auth)), ['auth', 'log'])
+		self.assertEqual( calls_of( registry.bypass( inner, auth)), ['free', 'log'])
+		self.assertRaises( ValueError, registry.bypass, inner, auth, log)
+		self.assertEqual( calls_of( registry.get_layer( inner, log)), ['log'])
+	
+	def test26_matrix( self) :
+		registry = DecoratorRegistry()
+		auth, limit, log = [registry.decorator( just_decorator) for _ in range( 3)]
+		
+		def make( name, module, *decorators) :
+			fn = lambda : None
+			fn.__name__, fn.__qualname__, fn.__module__ = name, name, module
+			for decorator in decorators :
+				fn = decorator( fn)
+			return registry.get_real_function( fn)
+		
+		open_view   = make( 'open_view', 'views', log)
+		auth_view   = make( 'auth_view', 'views', auth, log)
+		secure_view = make( 'secure_view', 'views', auth, limit)
+		job         = make( 'job', 'jobs', limit, log)
+		
+		matrix = registry.matrix()
+		self.assertEqual( len( matrix), 4)
+		self.assertEqual( matrix.decorators, ( auth, limit, log))
+		self.assertEqual( set( matrix.select( all_of = [auth], none_of = [limit])), set( [auth_view]))
+		self.assertEqual( set( matrix.select( any_of = [auth, limit], none_of = [log])), set( [secure_view]))
+		self.assertEqual( set( matrix.select( none_of = [auth])), set( [open_view, job]))
+		self.assertEqual( matrix.count( all_of = [log], module = 'views'), 2)
+		self.assertEqual( matrix.counts_by_module(), {
+			'views' : { auth : 2, limit : 1, log : 2},
+			'jobs'  : { limit : 1, log : 1},
+		})
+		self.assertEqual( registry.matrix( 'jobs').functions, ( job,))
+		self.assertEqual( matrix.generation, registry.generation)
+		
+		array = matrix.to_array()
+		row = matrix.functions.index( secure_view)
+		self.assertEqual( [bool( array[row, i] if hasattr( array, 'shape') else array[row * 3 + i]) for i in range( 3)],
+			[True, True, False])
+	
+	def test27_shared_combinations( self) :
+		registry = DecoratorRegistry()
+		first, second = registry.decorator( just_decorator), registry.decorator( free_decorator)
+		
+		before = registry.memory_usage()
+		
+		@second
+		@first
+		def one() : pass
+		
+		@second
+		@first
+		def two() : pass
+		
+		@first
+		def three() : pass
+		
+		self.assertTrue( registry.get_decorators( one) is registry.get_decorators( two))
+		self.assertEqual( registry.get_decorators( three), ( first,))
+		self.assertTrue( registry.is_decorated_with_all( two, first, second))
+		
+		after = registry.memory_usage()
+		self.assertEqual( before['total'], sum( before[part] for part in ( 'records', 'decorators', 'layers', 'indexes')))
+		self.assertTrue( after['records'] > before['records'] and after['layers'] > before['layers'])
+		# ( first,), ( first, second) and the empty one of the wrappers
+		self.assertEqual( after['combinations'], 3)
+	
+	def test28_weak_indexes( self) :
+		import gc
+		registry = DecoratorRegistry()
+		tenant = registry.parametrized_decorator( lambda a : just_decorator, index = ( 'a',))
+		
+		def handler_of( name) :
+			@tenant( name)
+			def handler() : return name
+			return handler
+		
+		handlers = [handler_of( 'tenant%d' %i) for i in range( 10)]
+		stats = registry.stats()
+		self.assertEqual( len( registry.functions_decorated_with( tenant)), 10)
+		self.assertEqual( stats['stale'], 0)
+		self.assertTrue( stats['indexed'] >= 20)
+		
+		native     = registry.get_real_function( handlers[0])
+		generation = registry.generation
+		del handlers[1:]
+		gc.collect()
+		
+		self.assertEqual( registry.functions_decorated_with( tenant), [native])
+		
+		# collected functions are logged as removed
+		changes = registry.changes_since( generation)
+		self.assertEqual( registry.generation, generation + 9)
+		self.assertEqual( [( c.action, c.function, c.decorator, c.qualname) for c in changes],
+			[( DecoratorRegistry.REMOVED, None, tenant, native.__qualname__)] * 9)
+		self.assertEqual( registry.find( tenant, a = 'tenant1'), [])
+		self.assertEqual( registry.find( tenant, a = 'tenant0'), [native])
+		
+		stats = registry.stats()
+		self.assertTrue( stats['collected'] >= 18)
+		self.assertEqual( stats['stale'], 18)
+		self.assertEqual( registry.prune(), 18)
+		self.assertEqual( registry.stats()['stale'], 0)
+		self.assertEqual( registry.stats()['pruned'], 18)
+	
+	def test29_freeze( self) :
+		import operator
+		registry = DecoratorRegistry()
+		deco = registry.decorator( just_decorator)
+		route = registry.parametrized_decorator( lambda path : just_decorator, index = ( 'path',))
+		
+		@deco
+		@route( '/users')
+		def users() : pass
+		
+		native = registry.get_real_function( users)
+		self.assertTrue( registry.freeze() is registry)
+		self.assertTrue( registry.frozen)
+		
+		self.assertEqual( registry.get_decorators( users), ( route, deco))
+		self.assertTrue( registry.is_decorated_with_all( users, route, deco))
+		self.assertEqual( registry.functions_decorated_with( deco), [native])
+		self.assertEqual( registry.find( route, path = '/users'), [native])
+		self.assertEqual( registry.matrix().count( all_of = [deco]), 1)
+		self.assertEqual( registry.stats()['stale'], 0)
+		self.assertTrue( registry.bypass( users, deco) is not users)
+		
+		self.assertRaises( RuntimeError, deco, lambda : None)
+		self.assertRaises( RuntimeError, registry.decorator, just_decorator)
+		self.assertRaises( RuntimeError, registry.disable, deco)
+		self.assertRaises( RuntimeError, registry.subscribe, deco, lambda *args : None)
+		self.assertRaises( TypeError, operator.setitem, registry._functions_index, deco, {})
+	
+	def test30_enable_restores_only_disabled( self) :
+		import sys, types
+		registry = DecoratorRegistry()
+		calls = []
+		
+		def traced( fn) :
+			def wrapper( *args, **kwargs) :
+				calls.append( fn.__name__)
+				return fn( *args, **kwargs)
+			return wrapper
+		
+		trace = registry.decorator( traced)
+		other = registry.decorator( just_decorator)
+		
+		module = types.ModuleType( 'regd_switched_plain')
+		sys.modules[module.__name__] = module
+		try :
+			exec( '\n'.join( [
+				"def f() : return 'f'",
+				"traced_f = trace( f)",
+				"def g() : return 'g'",
+				"other_g = other( g)",
+				"traced_g = trace( g)",
+			]), dict( module.__dict__, trace = trace, other = other), module.__dict__)
+			
+			f, g, other_g = module.f, module.g, module.other_g
+			
+			self.assertEqual( registry.disable( trace), 0)
+			self.assertEqual( registry.enable( trace), 0)
+			self.assertTrue( module.f is f and module.g is g and module.other_g is other_g)
+			self.assertTrue( other_g.__closure__[0].cell_contents is g)
+			
+			self.assertEqual( ( module.f(), module.g(), module.other_g()), ( 'f', 'g', 'g'))
+			self.assertEqual( calls, [])
+			self.assertEqual( ( module.traced_f(), module.traced_g()), ( 'f', 'g'))
+			self.assertEqual( calls, ['f', 'g'])
+		finally :
+			del sys.modules[module.__name__]
+	
+	def test31_hook_decorator_callables( self) :
+		import functools
+		registry = DecoratorRegistry()
+		seen = []
+		before = registry.hook_decorator( before = lambda *args, **kwargs : seen.append( ( args, kwargs)), name = 'before')
+		
+		partial = before( functools.partial( lambda a, b = 3, *, c = 4 : ( a, b, c), 1))
+		self.assertEqual( partial(), ( 1, 3, 4))
+		self.assertEqual( partial( 2, c = 5), ( 1, 2, 5))
+		
+		class Point( object) :
+			def __init__( self, x, y = 0) :
+				self.x, self.y = x, y
+		
+		point = before( Point)( 1)
+		self.assertEqual( ( point.x, point.y), ( 1, 0))
+		self.assertEqual( seen, [( ( 3,), { 'c' : 4}), ( ( 2,), { 'c' : 5}), ( ( 1, 0), {})])
+	
+	def test32_find_after_reload( self) :
+		import importlib, os, shutil, sys, tempfile, types
+		
+		routes = types.ModuleType( 'regd_routes')
+		routes.route = DecoratorRegistry.parametrized_decorator( lambda path : just_decorator, index = ( 'path',))
+		sys.modules['regd_routes'] = routes
+		
+		DecoratorRegistry.track_modules( True)
+		path = tempfile.mkdtemp()
+		dont_write_bytecode, sys.dont_write_bytecode = sys.dont_write_bytecode, True
+		try :
+			source = "from regd_routes import route\n@route( '/a')\ndef %s() : pass\n"
+			with open( os.path.join( path, 'regd_routed.py'), 'w') as f :
+				f.write( source %'first')
+			sys.path.insert( 0, path)
+			module = importlib.import_module( 'regd_routed')
+			first  = module.first
+			self.assertEqual( DecoratorRegistry.find( routes.route, path = '/a'), [DecoratorRegistry.get_real_function( first)])
+			
+			with open( os.path.join( path, 'regd_routed.py'), 'w') as f :
+				f.write( source %'second_one')
+			importlib.reload( module)
+			self.assertEqual( [fn.__name__ for fn in DecoratorRegistry.find( routes.route, path = '/a')], ['second_one'])
+		finally :
+			DecoratorRegistry.track_modules( False)
+			sys.dont_write_bytecode = dont_write_bytecode
+			sys.path.remove( path)
+			sys.modules.pop( 'regd_routed', None)
+			sys.modules.pop( 'regd_routes', None)
+			shutil.rmtree( path)
+	
+	def test33_disable_methods_table( self) :
+		import sys, types
+		from regd import DecoratedClass
+		registry = DecoratorRegistry()
+		calls = []
+		
+		def traced( fn) :
+			def wrapper( *args, **kwargs) :
+				calls.append( fn.__name__)
+				return fn( *args, **kwargs)
+			return wrapper
+		
+		trace = registry.decorator( traced)
+		
+		module = types.ModuleType( 'regd_switched_table')
+		sys.modules[module.__name__] = module
+		try :
+			exec( '\n'.join( [
+				"class Plugin( DecoratedClass, registry = registry) :",
+				"	@trace",
+				"	def load( self) : return 'load'",
+				"class MyPlugin( Plugin) :",
+				"	pass",
+			]), dict( module.__dict__, DecoratedClass = DecoratedClass, registry = registry, trace = trace),
+				module.__dict__)
+			
+			def call_all( cls) :
+				return [method( cls()) for methods in registry.decorated_methods( cls, trace)
+					for method in methods.values()]
+			
+			self.assertEqual( ( call_all( module.Plugin), call_all( module.MyPlugin)), ( ['load'], ['load']))
+			self.assertEqual( len( calls), 2)
+			
+			self.assertEqual( registry.disable( trace), 1)
+			self.assertEqual( ( call_all( module.Plugin), call_all( module.MyPlugin)), ( ['load'], ['load']))
+			self.assertEqual( len( calls), 2)
+			
+			self.assertEqual( registry.enable( trace), 1)
+			self.assertEqual( ( call_all( module.Plugin), call_all( module.MyPlugin)), ( ['load'], ['load']))
+			self.assertEqual( len( calls), 4)
+		finally :
+			del sys.modules[module.__name__]
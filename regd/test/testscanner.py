@@ -0,0 +1,166 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+Unit tests for static scanner module
+"""
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from regd.scanner import StaticScanner, scan_package
+
+SOURCE = '''
+from app import route, task, app
+
+@route( '/users', methods = ( 'GET',))
+@task
+def users() : pass
+
+class View( object) :
+	@app.route( path)
+	def get( self) :
+		@task
+		def inner() : pass
+
+def plain() : pass
+'''
+
+class TestStaticScanner( unittest.TestCase) :
+
+	def setUp( self) :
+		self.path = tempfile.mkdtemp()
+		self.package = os.path.join( self.path, 'scanned')
+		os.makedirs( os.path.join( self.package, 'sub'))
+		for path, source in [( '__init__.py', ''), ( 'views.py', SOURCE), ( os.path.join( 'sub', '__init__.py'), ''),
+		                     ( os.path.join( 'sub', 'plain.py'), 'def f() : pass\n')] :
+			with open( os.path.join( self.package, path), 'w') as f :
+				f.write( source)
+
+	def tearDown( self) :
+		shutil.rmtree( self.path)
+
+	def test1_scan( self) :
+		scanner  = StaticScanner( ['route', 'task'])
+		manifest = scanner.scan( self.package)
+
+		self.assertEqual( list( manifest.keys()), ['scanned.views'])
+		self.assertEqual( manifest['scanned.views'], (
+			( 'users', 6, ( ( 'task', (), {}), ( 'route', ( '/users',), { 'methods' : ( 'GET',) }))),
+			( 'View.get', 10, ( ( 'app.route', ( Ellipsis,), {}),)),
+			( 'View.get.<locals>.inner', 12, ( ( 'task', (), {}),)),
+		))
+		self.assertEqual( [( m, q) for m, q, a, k in scanner.functions_decorated_with( manifest, 'route')],
+			[( 'scanned.views', 'users'), ( 'scanned.views', 'View.get')])
+
+	def test2_cache( self) :
+		cache = os.path.join( self.path, 'manifest')
+		manifest = StaticScanner( ['route', 'task'], cache = cache).scan( self.package)
+		self.assertTrue( os.path.exists( cache))
+
+		# touched but not changed files are not parsed again
+		views = os.path.join( self.package, 'views.py')
+		os.utime( views, ( 0, 0))
+		scanner = StaticScanner( ['route', 'task'], cache = cache)
+		scanner.scan_source = None
+		self.assertEqual( scanner.scan( self.package), manifest)
+
+		# another set of decorators does not use the stale cache
+		self.assertEqual( StaticScanner( ['task'], cache = cache).scan( self.package)['scanned.views'][0][2],
+			( ( 'task', (), {}),))
+
+	def test3_syntax_error( self) :
+		cache  = os.path.join( self.path, 'manifest')
+		broken = os.path.join( self.package, 'broken.py')
+		with open( broken, 'w') as f :
+			f.write( '@route(\ndef f() : pass\n')
+
+		scanner  = StaticScanner( ['route', 'task'], cache = cache)
+		manifest = scanner.scan( self.package)
+		self.assertEqual( list( manifest.keys()), ['scanned.views'])
+		self.assertEqual( list( scanner.errors.keys()), [broken])
+		self.assertTrue( 'SyntaxError' in scanner.errors[broken])
+
+		# the error is cached, the broken file is not parsed again
+		scanner = StaticScanner( ['route', 'task'], cache = cache)
+		scanner.scan_source = None
+		self.assertEqual( scanner.scan( self.package), manifest)
+		self.assertEqual( list( scanner.errors.keys()), [broken])
+
+		with open( broken, 'w') as f :
+			f.write( '@route( "/f")\ndef f() : pass\n')
+
+		scanner = StaticScanner( ['route', 'task'], cache = cache)
+		self.assertEqual( scanner.scan( self.package)['scanned.broken'], ( ( 'f', 2, ( ( 'route', ( '/f',), {}),)),))
+		self.assertEqual( scanner.errors, {})
+
+	def test4_scan_package( self) :
+		with open( os.path.join( self.package, 'broken.py'), 'w') as f :
+			f.write( 'raise RuntimeError( "broken")\n')
+		# decorators of the test's own, the functions of the shared ones outlive the test
+		with open( os.path.join( self.package, 'decorators.py'), 'w') as f :
+			f.write( 'from regd.registry import DecoratorRegistry\n'
+			         'def deco( fn) : return fn\ndef deco2( fn) : return fn\n'
+			         'deco, deco2 = DecoratorRegistry.decorator( deco), DecoratorRegistry.decorator( deco2)\n')
+		with open( os.path.join( self.package, 'handlers.py'), 'w') as f :
+			f.write( 'from scanned.decorators import deco, deco2\n@deco2\n@deco\ndef handler() : pass\n')
+
+		sys.path.insert( 0, self.path)
+		try :
+			report = scan_package( 'scanned', workers = 4)
+		finally :
+			sys.path.remove( self.path)
+			for name in list( sys.modules) :
+				if name == 'scanned' or name.startswith( 'scanned.') :
+					del sys.modules[name]
+
+		self.assertEqual( report.functions, { 'scanned.handlers.handler' : ( 'deco', 'deco2') })
+		self.assertEqual( sorted( report.modules),
+			['scanned', 'scanned.broken', 'scanned.decorators', 'scanned.handlers', 'scanned.sub',
+			 'scanned.sub.plain', 'scanned.views'])
+		self.assertEqual( sorted( report.errors), ['scanned.broken', 'scanned.views'])
+		self.assertTrue( 'RuntimeError' in report.errors['scanned.broken'])
+		self.assertEqual( pickle.loads( pickle.dumps( report)).functions, report.functions)
+		self.assertRaises( ValueError, scan_package, 'regd.test', mode = 'fiber')
+
+	def test5_scan_package_timeout( self) :
+		for i in range( 4) :
+			with open( os.path.join( self.package, 'slow%d.py' %i), 'w') as f :
+				f.write( 'import time\ntime.sleep( 0.2)\n')
+
+		sys.path.insert( 0, self.path)
+		try :
+			report = scan_package( 'scanned', workers = 1, timeout = 0.3)
+		finally :
+			sys.path.remove( self.path)
+			for name in list( sys.modules) :
+				if name == 'scanned' or name.startswith( 'scanned.') :
+					del sys.modules[name]
+
+		# the timeout is for the whole scan, not for every module, so the modules queued behind
+		# the slow ones to the single worker can't make it
+		self.assertTrue( 'scanned.slow3' in report.timeouts)
+		self.assertTrue( 'scanned.views' in report.timeouts)
+		self.assertEqual( sorted( report.modules),
+			['scanned', 'scanned.slow0', 'scanned.slow1', 'scanned.slow2', 'scanned.slow3',
+			 'scanned.sub', 'scanned.sub.plain', 'scanned.views'])
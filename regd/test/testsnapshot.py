@@ -0,0 +1,148 @@
+"""
+This code is subject to MIT License
+
+Copyright (c) 2012 Mykhailo Stadnyk <mikhus@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+Unit tests for registry snapshot module
+"""
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+from regd.registry import DecoratorRegistry
+from regd.snapshot import RegistrySnapshot
+from regd.test.testregistry import just_decorator
+
+def route( path, methods = ( 'GET',), handler = None) :
+	return just_decorator
+
+class TestRegistrySnapshot( unittest.TestCase) :
+
+	def setUp( self) :
+		self.registry = DecoratorRegistry()
+		self.auth     = self.registry.decorator( just_decorator)
+		self.route    = self.registry.parametrized_decorator( route)
+
+		self.module = types.ModuleType( 'regd_snapshot_views')
+		sys.modules[self.module.__name__] = self.module
+		exec( '\n'.join( [
+			"@auth",
+			"@route( '/users', methods = ( 'GET', 'POST'), handler = object())",
+			"def users() : return 'users'",
+			"class Admin( object) :",
+			"	@route( '/admin')",
+			"	def index( self) : pass",
+		]), dict( self.module.__dict__, auth = self.auth, route = self.route), self.module.__dict__)
+
+	def tearDown( self) :
+		del sys.modules[self.module.__name__]
+
+	def check( self, snapshot) :
+		name = self.module.__name__
+		self.assertEqual( len( snapshot), 2)
+		self.assertEqual( sorted( snapshot.decorators()), ['just_decorator', 'route'])
+		self.assertEqual( snapshot.functions_decorated_with( self.route), [( name, 'users'), ( name, 'Admin.index')])
+		self.assertEqual( snapshot.functions_decorated_with( 'just_decorator'), [( name, 'users')])
+		self.assertEqual( snapshot.get_decorators( name, 'users'), ( 'route', 'just_decorator'))
+		self.assertEqual( snapshot.get_decorators( name, 'missing'), ())
+		self.assertEqual( snapshot.get_decorator_arguments( name, 'users', 'route'),
+			[( ( '/users',), { 'methods' : ( 'GET', 'POST'), 'handler' : Ellipsis})])
+		self.assertEqual( snapshot.get_decorator_arguments( name, 'Admin.index', 'just_decorator'), [])
+		self.assertEqual( snapshot.load( name, 'users')(), 'users')
+
+	def test1_file( self) :
+		path = tempfile.mkdtemp()
+		try :
+			filename = os.path.join( path, 'registry.bin')
+			self.assertEqual( self.registry.export( filename), os.path.getsize( filename))
+
+			with RegistrySnapshot.open( filename) as snapshot :
+				self.check( snapshot)
+		finally :
+			shutil.rmtree( path)
+
+		self.assertRaises( ValueError, RegistrySnapshot, b'\0' * 64)
+
+	def test2_shared_memory( self) :
+		block = RegistrySnapshot.share( self.registry.dumps())
+		try :
+			snapshot = RegistrySnapshot.attach( block.name)
+			self.check( snapshot)
+			snapshot.close()
+		finally :
+			block.close()
+			block.unlink()
+
+	def test3_subprocesses( self) :
+		import subprocess
+		import regd
+
+		block  = RegistrySnapshot.share( self.registry.dumps())
+		env    = dict( os.environ, PYTHONPATH = os.path.dirname( os.path.dirname( os.path.abspath( regd.__file__))))
+		script = ( "from regd.snapshot import RegistrySnapshot\n"
+		           "snapshot = RegistrySnapshot.attach( %r)\n"
+		           "print( snapshot.functions_decorated_with( 'route'))\n"
+		           "snapshot.close()\n" %block.name)
+		try :
+			# the block outlives the workers attached to it
+			for _ in range( 2) :
+				output = subprocess.check_output( [sys.executable, '-c', script], env = env, stderr = subprocess.STDOUT)
+				self.assertEqual( output.decode().strip(),
+					"[('regd_snapshot_views', 'users'), ('regd_snapshot_views', 'Admin.index')]")
+		finally :
+			block.close()
+			block.unlink()
+
+	def test4_tracker( self) :
+		import subprocess
+		import regd
+
+		# the creator unlinks the block attached by itself and by the spawned workers sharing its
+		# resource tracker, so the tracker should have nothing to complain about
+		env  = dict( os.environ, PYTHONPATH = os.path.dirname( os.path.dirname( os.path.abspath( regd.__file__))))
+		path = tempfile.mkdtemp()
+		try :
+			script = os.path.join( path, 'attached.py')
+			with open( script, 'w') as f :
+				f.write( '\n'.join( [
+					"import multiprocessing",
+					"from regd.registry import DecoratorRegistry",
+					"from regd.snapshot import RegistrySnapshot",
+					"def attach( name) :",
+					"	with RegistrySnapshot.attach( name) as snapshot :",
+					"		return len( snapshot)",
+					"if __name__ == '__main__' :",
+					"	block = RegistrySnapshot.share( DecoratorRegistry().dumps())",
+					"	attach( block.name)",
+					"	with multiprocessing.get_context( 'spawn').Pool( 2) as pool :",
+					"		print( pool.map( attach, [block.name] * 2))",
+					"	block.close()",
+					"	block.unlink()",
+				]) + '\n')
+
+			process = subprocess.run( [sys.executable, script], env = env, timeout = 60,
+				stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+		finally :
+			shutil.rmtree( path)
+
+		self.assertEqual( ( process.returncode, process.stdout.decode().strip(), process.stderr.decode()),
+			( 0, '[0, 0]', ''))
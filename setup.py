@@ -40,6 +40,7 @@ setup(
     keywords     = ["decorator", "trace"],
     platforms    = ['OS Independent'],
     license      = 'MIT License',
+    python_requires = '>=3.8',
     classifiers  = [
 		'Development Status :: 4 - Beta',
 		'Environment :: Other Environment',
@@ -47,8 +48,8 @@ setup(
 		'License :: OSI Approved :: MIT License',
 		'Natural Language :: English',
 		'Operating System :: OS Independent',
-		'Programming Language :: Python :: 2',
 		'Programming Language :: Python :: 3',
+		'Programming Language :: Python :: 3 :: Only',
 		'Topic :: Software Development :: Libraries :: Python Modules',
 	],
     long_description = """\
@@ -58,6 +59,6 @@ Decorators trace meta-info for Python
 Adds possibility to register decorators and
 trace their usage
 
-This version requires Python 2 or later; Python 3+ is included as well
+This version requires Python 3.8 or later
 """
 )